@@ -0,0 +1,254 @@
+import hmac
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, g, Response
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+import datetime
+
+from models import db, Product, Category
+from search import all_categories
+from cache import catalog
+from querycount import query_budget
+from database import read_only
+from products import validate_product, category_by_id, import_products, import_format
+from sales import sales_dashboard, DASHBOARD_DAYS, MAX_DASHBOARD_DAYS
+from deletes import delete_product_cascade, delete_category_cascade, product_delete_counts, category_delete_counts
+from reorder import reorder_report, category_reorders, WINDOW_DAYS, MAX_WINDOW_DAYS, LEAD_DAYS, COVER_DAYS
+from auth import admin_required
+
+bp = Blueprint('admin', __name__)
+
+@bp.route('/admin')
+@admin_required
+@read_only
+@query_budget(2)
+def dashboard():
+    categories = db.session.query(Category, func.count(Product.id)) \
+        .outerjoin(Category.products) \
+        .group_by(Category.id) \
+        .order_by(Category.id) \
+        .all()
+    return render_template('admin.html', user=g.user, categories=categories, cache_stats=catalog.stats())
+
+@bp.route('/admin/sales')
+@admin_required
+@read_only
+@query_budget(3)
+def sales():
+    days = request.args.get('days', '')
+    days = min(int(days), MAX_DASHBOARD_DAYS) if days.isdigit() and int(days) > 0 else DASHBOARD_DAYS
+    return render_template('sales.html', user=g.user, **sales_dashboard(days))
+
+@bp.route('/admin/reorder')
+@admin_required
+@read_only
+# the user, categories, then products and sales when anything changed since the report was cached
+@query_budget(4)
+def reorder():
+    window = request.args.get('window', '')
+    window = min(int(window), MAX_WINDOW_DAYS) if window.isdigit() and int(window) > 0 else WINDOW_DAYS
+    rows, total = reorder_report(window)
+    return render_template('reorder.html', user=g.user, rows=rows, total=total, window=window,
+                           lead_days=LEAD_DAYS, cover_days=COVER_DAYS)
+
+def metrics_text():
+    return Response(current_app.extensions['metrics'].exposition(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/admin/metrics')
+def metrics_page():
+    token = current_app.config['METRICS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + token):
+        return metrics_text()
+    return admin_required(metrics_text)()
+
+@bp.route('/category/add')
+@admin_required
+def add_category():
+    return render_template('category/add.html', user=g.user)
+
+@bp.route('/category/add', methods=['POST'])
+@admin_required
+def add_category_post():
+    name = request.form.get('name')
+    if not name or name == '':
+        flash('Category name cannot be empty.')
+        return redirect(url_for('admin.add_category'))
+    if len(name) > 64:
+        flash('Category name cannot be greater than 64 characters.')
+        return redirect(url_for('admin.add_category'))
+    category = Category(name=name)
+    db.session.add(category)
+    db.session.commit()
+    catalog.bump()
+    flash('Category added successfully.')
+    return redirect(url_for('admin.dashboard'))
+
+@bp.route('/category/<int:id>/show')
+@admin_required
+@query_budget(5)
+def show_category(id):
+    category = Category.query.options(selectinload(Category.products)).get(id)
+    if not category:
+        flash('Category does not exist.')
+        return redirect(url_for('admin.dashboard'))
+    reorders = {row.id: row for row in category_reorders([id], all_products=True)[id]}
+    return render_template('category/show.html', user=g.user, category=category, reorders=reorders)
+
+@bp.route('/product/add')
+@admin_required
+def add_product():
+    category_id = -1
+    c = request.args.get('category_id', '')
+    if c and c != '' and c.isdigit():
+        if Category.query.get(int(c)):
+            category_id = int(c)
+
+    return render_template('product/add.html', 
+                           user=g.user,
+                           category_id=category_id,
+                           categories=catalog.get_or_set('categories', all_categories),
+                           nowstring = datetime.datetime.now().strftime("%Y-%m-%d")
+                           )
+
+@bp.route('/product/add', methods=['POST'])
+@admin_required
+def add_product_post():
+    values, error = validate_product(
+        request.form.get('name'),
+        request.form.get('quantity'),
+        request.form.get('price'),
+        request.form.get('category'),
+        request.form.get('manufacture_date'),
+        category_by_id,
+    )
+    if error:
+        flash(error)
+        return redirect(url_for('admin.add_product'))
+    product = Product(**values)
+    db.session.add(product)
+    db.session.commit()
+    catalog.bump()
+    catalog.bump_categories([product.category_id])
+    flash('Product added successfully.')
+    return redirect(url_for('admin.show_category', id=product.category_id))
+
+@bp.route('/product/import')
+@admin_required
+def import_products_page():
+    return render_template('product/import.html', user=g.user)
+
+@bp.route('/product/import', methods=['POST'])
+@admin_required
+def import_products_post():
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        flash('Please choose a file to import.')
+        return redirect(url_for('admin.import_products_page'))
+    report = import_products(file.stream, import_format(file.filename, request.form.get('format')))
+    flash('Imported ' + str(report['inserted']) + ' products successfully.')
+    return render_template('product/import.html', user=g.user, report=report)
+
+@bp.route('/product/<int:id>/edit')
+@admin_required
+def edit_product(id):
+    product = Product.query.get(id)
+    return render_template('product/edit.html', user=g.user,
+                           product=product,
+                           categories=catalog.get_or_set('categories', all_categories),
+                           nowstring = datetime.datetime.now().strftime("%Y-%m-%d"),
+                           manufacture_date = product.man_date.strftime("%Y-%m-%d")
+                           )
+
+@bp.route('/product/<int:id>/edit', methods=['POST'])
+@admin_required
+def edit_product_post(id):
+    values, error = validate_product(
+        request.form.get('name'),
+        request.form.get('quantity'),
+        request.form.get('price'),
+        request.form.get('category'),
+        request.form.get('manufacture_date'),
+        category_by_id,
+    )
+    if error:
+        flash(error)
+        return redirect(url_for('admin.add_product'))
+    product = Product.query.get(id)
+    old_category_id = product.category_id
+    product.name = values['name']
+    product.quantity = values['quantity']
+    product.price = values['price']
+    product.category_id = values['category_id']
+    product.man_date = values['man_date']
+    db.session.commit()
+    catalog.bump()
+    catalog.bump_categories([old_category_id, product.category_id])
+    flash('Product edited successfully.')
+    return redirect(url_for('admin.show_category', id=product.category_id))
+
+@bp.route('/product/<int:id>/delete')
+@admin_required
+@query_budget(3)
+def delete_product(id):
+    product = Product.query.get(id)
+    if not product:
+        flash('Product does not exist.')
+        return redirect(url_for('admin.dashboard'))
+    return render_template('product/delete.html', user=g.user, product=product, counts=product_delete_counts(id))
+
+@bp.route('/product/<int:id>/delete', methods=['POST'])
+@admin_required
+def delete_product_post(id):
+    category_id = db.session.scalar(select(Product.category_id).where(Product.id == id))
+    if category_id is None:
+        flash('Product does not exist.')
+        return redirect(url_for('admin.dashboard'))
+    delete_product_cascade(id)
+    catalog.bump()
+    catalog.bump_categories([category_id])
+    flash('Product deleted successfully.')
+    return redirect(url_for('admin.dashboard'))
+
+@bp.route('/category/<int:id>/edit')
+@admin_required
+def edit_category(id):
+    return render_template('category/edit.html', user=g.user, category=Category.query.get(id))
+
+@bp.route('/category/<int:id>/edit', methods=['POST'])
+@admin_required
+def edit_category_post(id):
+    category = Category.query.get(id)
+    name = request.form.get('name')
+    if not name or name == '':
+        flash('Category name cannot be empty.')
+        return redirect(url_for('admin.edit_category', id=id))
+    if len(name) > 64:
+        flash('Category name cannot be greater than 64 characters.')
+        return redirect(url_for('admin.edit_category', id=id))
+    category.name = name
+    db.session.commit()
+    catalog.bump()
+    flash('Category updated successfully.')
+    return redirect(url_for('admin.dashboard'))
+
+@bp.route('/category/<int:id>/delete')
+@admin_required
+@query_budget(3)
+def delete_category(id):
+    category = Category.query.get(id)
+    if not category:
+        flash('Category does not exist.')
+        return redirect(url_for('admin.dashboard'))
+    return render_template('category/delete.html', user=g.user, category=category, counts=category_delete_counts(id))
+
+@bp.route('/category/<int:id>/delete', methods=['POST'])
+@admin_required
+def delete_category_post(id):
+    category = Category.query.get(id)
+    if not category:
+        flash('Category does not exist.')
+        return redirect(url_for('admin.dashboard'))
+    delete_category_cascade(id)
+    catalog.bump()
+    catalog.bump_categories([id])
+    flash('Category deleted successfully.')
+    return redirect(url_for('admin.dashboard'))
@@ -0,0 +1,191 @@
+from functools import wraps
+from flask import Blueprint, current_app, g, request
+from flask_restful import Api, Resource, abort
+from sqlalchemy import select
+from werkzeug.http import http_date, quote_etag
+
+from models import db, Product, Cart, CheckoutJob
+from search import ProductRow, all_categories
+from cache import catalog
+from checkout import checkout
+from checkout_queue import enqueue_checkout, job_status
+from carts import parse_lines, update_cart
+from history import transaction_dicts_page
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+api = Api(bp)
+
+MAX_BULK = 500
+PRODUCTS_PER_PAGE = 100
+
+## helpers
+
+def api_auth_required(func):
+    @wraps(func)
+    def inner(*args, **kwargs):
+        if not g.user:
+            abort(401, message='You need to login first.')
+        return func(*args, **kwargs)
+    return inner
+
+def catalog_response(load):
+    '''
+    responses built from the catalog are tagged with the catalog version, so
+    clients can revalidate with If-None-Match / If-Modified-Since and get a 304
+    without us touching the database. only with a shared catalog cache, the
+    local one's versions don't see other workers' writes
+    '''
+    if not catalog.shared:
+        return load(), 200, {'Cache-Control': 'no-cache'}
+    etag = 'catalog-%s-%d' % (catalog.scope(), catalog.version())
+    modified = catalog.last_modified()
+    headers = {'ETag': quote_etag(etag, weak=True), 'Last-Modified': http_date(modified), 'Cache-Control': 'no-cache'}
+    if request.if_none_match:
+        if request.if_none_match.contains_weak(etag):
+            return None, 304, headers
+    elif request.if_modified_since and request.if_modified_since >= modified:
+        return None, 304, headers
+    return load(), 200, headers
+
+def product_dict(row):
+    product = row._asdict()
+    product['man_date'] = product['man_date'].isoformat()
+    return product
+
+def parse_ids(value):
+    ids = [id for id in value.split(',') if id]
+    if not all(id.isdigit() for id in ids):
+        abort(400, message='ids must be a comma separated list of numbers.')
+    if len(ids) > MAX_BULK:
+        abort(400, message='Cannot fetch more than %d products at once.' % MAX_BULK)
+    return [int(id) for id in ids]
+
+def product_rows(*where, limit=None):
+    query = select(Product.id, Product.name, Product.category_id, Product.quantity, Product.price, Product.man_date) \
+        .where(*where).order_by(Product.id).limit(limit)
+    return [ProductRow(*row) for row in db.session.execute(query)]
+
+## catalog
+
+class CategoryList(Resource):
+    def get(self):
+        return catalog_response(lambda: [row._asdict() for row in catalog.get_or_set('categories', all_categories)])
+
+class ProductList(Resource):
+    def get(self):
+        '''
+        ?ids=1,2,3 fetches many products in one call, otherwise products are
+        paged by id with ?after=<last id> and filtered by ?category_id=
+        '''
+        if request.args.get('ids') is not None:
+            ids = parse_ids(request.args['ids'])
+            return catalog_response(lambda: [product_dict(row) for row in product_rows(Product.id.in_(ids))])
+        where = []
+        category_id = request.args.get('category_id', '')
+        if category_id.isdigit():
+            where.append(Product.category_id == int(category_id))
+        after = request.args.get('after', '')
+        if after.isdigit():
+            where.append(Product.id > int(after))
+        def load():
+            rows = product_rows(*where, limit=PRODUCTS_PER_PAGE + 1)
+            next_cursor = rows[PRODUCTS_PER_PAGE - 1].id if len(rows) > PRODUCTS_PER_PAGE else None
+            return {'products': [product_dict(row) for row in rows[:PRODUCTS_PER_PAGE]], 'next': next_cursor}
+        return catalog_response(load)
+
+class ProductResource(Resource):
+    def get(self, id):
+        def load():
+            rows = product_rows(Product.id == id)
+            if not rows:
+                abort(404, message='Product does not exist.')
+            return product_dict(rows[0])
+        return catalog_response(load)
+
+## cart and orders
+
+class CartResource(Resource):
+    method_decorators = [api_auth_required]
+
+    def get(self):
+        rows = db.session.execute(
+            select(Cart.product_id, Product.name, Cart.quantity, Product.price)
+            .join(Product, Product.id == Cart.product_id)
+            .where(Cart.user_id == g.user.id)
+            .order_by(Cart.id)
+        ).all()
+        return {
+            'lines': [row._asdict() for row in rows],
+            'total': sum(row.price * row.quantity for row in rows),
+        }
+
+    def post(self):
+        '''
+        add many lines at once: {"lines": [{"product_id": 1, "quantity": 2}, ...]}.
+        either every line is added or, if any is invalid, none are.
+        '''
+        return self.update(add=True)
+
+    def put(self):
+        '''set the quantity of many lines at once, same body as post. quantity 0 removes a line'''
+        return self.update(add=False)
+
+    def update(self, add):
+        quantities, error = parse_lines((request.get_json(silent=True) or {}).get('lines'), add)
+        if error:
+            abort(400, message=error)
+        errors = update_cart(g.user.id, quantities, add)
+        if errors:
+            return {'message': 'No lines were changed.', 'errors': errors}, 400
+        return self.get(), 201 if add else 200
+
+class CartLine(Resource):
+    method_decorators = [api_auth_required]
+
+    def delete(self, product_id):
+        deleted = Cart.query.filter_by(user_id=g.user.id, product_id=product_id).delete()
+        db.session.commit()
+        catalog.bump_user(g.user.id)
+        if not deleted:
+            abort(404, message='Product does not exist in cart.')
+        return None, 204
+
+class Checkout(Resource):
+    method_decorators = [api_auth_required]
+
+    def post(self):
+        '''with the checkout queue on, returns 202 and a job to poll at /checkout/<id>'''
+        if current_app.config['CHECKOUT_QUEUE']:
+            job, error = enqueue_checkout(g.user.id)
+            if error:
+                return {'message': error}, 409
+            return job_status(job), 202
+        transaction, error = checkout(g.user.id)
+        if error:
+            return {'message': error}, 409
+        return {'id': transaction.id, 'total': transaction.total}, 201
+
+class CheckoutJobResource(Resource):
+    method_decorators = [api_auth_required]
+
+    def get(self, id):
+        job = CheckoutJob.query.filter_by(id=id, user_id=g.user.id).first()
+        if not job:
+            abort(404, message='Checkout does not exist.')
+        return job_status(job)
+
+class OrderList(Resource):
+    method_decorators = [api_auth_required]
+
+    def get(self):
+        transactions, next_cursor = transaction_dicts_page(g.user.id, request.args.get('after'))
+        return {'transactions': transactions, 'next': next_cursor}
+
+api.add_resource(CategoryList, '/categories')
+api.add_resource(ProductList, '/products')
+api.add_resource(ProductResource, '/products/<int:id>')
+api.add_resource(CartResource, '/cart')
+api.add_resource(CartLine, '/cart/<int:product_id>')
+api.add_resource(Checkout, '/checkout')
+api.add_resource(CheckoutJobResource, '/checkout/<int:id>')
+api.add_resource(OrderList, '/orders')
@@ -1,10 +1,44 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask
 
-app = Flask(__name__)
+from config import Config
+from models import db
+import database, cache, querycount, metrics, responses
+import auth, admin, store, api
+import migrations, products, sales, checkout_queue, explain, archive
 
-import config
+def create_app(config=None):
+    '''
+    build the app. config is an object or dict of settings applied over Config.
+    nothing here touches the database, so any number of workers can start at
+    once; create the schema and the admin user once with `flask init-db`.
+    '''
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+    app.config['SQLALCHEMY_BINDS'] = dict(app.config['SQLALCHEMY_BINDS'],
+                                          archive=app.config['SQLALCHEMY_ARCHIVE_URI'] or app.config['SQLALCHEMY_DATABASE_URI'])
 
-import models
+    db.init_app(app)
+    database.init_app(app, db)
+    cache.init_app(app)
+    querycount.init_app(app)
+    metrics.init_app(app)
+    responses.init_app(app)
 
-import routes
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(admin.bp)
+    app.register_blueprint(store.bp)
+    app.register_blueprint(api.bp)
+
+    app.cli.add_command(migrations.init_db_command)
+    app.cli.add_command(migrations.upgrade_command)
+    app.cli.add_command(products.import_products_command)
+    app.cli.add_command(sales.backfill_command)
+    app.cli.add_command(checkout_queue.worker_command)
+    app.cli.add_command(archive.archive_command)
+    app.cli.add_command(explain.explain_queries_command)
+
+    return app
@@ -0,0 +1,82 @@
+import datetime
+import json
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, update, delete
+
+from models import db, Order, Transaction, ArchivedTransaction, CheckoutJob
+from database import upsert
+
+# transaction and order only ever grow, and order history pages don't need
+# years of old orders next to this week's. `flask archive-orders` moves
+# transactions older than ARCHIVE_AFTER_DAYS, with their orders folded into
+# one row, to archived_transaction on the 'archive' bind (its own database
+# with SQLALCHEMY_ARCHIVE_URI). only old transactions move and checkouts only
+# add new ones, so everything archived is older than everything live, and
+# history.py reads the archive only once a user pages past their live history.
+# the sales rollups already include archived orders and backfill reads both.
+
+ARCHIVE_BATCH = 1000
+
+def archive(before, batch=ARCHIVE_BATCH, progress=None):
+    '''
+    move transactions older than `before` to the archive, `batch` at a time.
+    each batch is written to the archive and committed before it is deleted
+    from the live tables, so an interrupted run leaves a batch in both places
+    (the next run overwrites its archived copy) but never loses one.
+    progress(moved) is called after every batch. returns how many were moved
+    '''
+    moved = last_id = 0
+    while True:
+        # walk the table in id order from where the last batch ended, so newer rows are only read once
+        transactions = db.session.execute(
+            select(Transaction.id, Transaction.user_id, Transaction.datetime, Transaction.total)
+            .where(Transaction.id > last_id, Transaction.datetime < before)
+            .order_by(Transaction.id)
+            .limit(batch)
+        ).all()
+        if not transactions:
+            return moved
+        ids = [transaction.id for transaction in transactions]
+        last_id = ids[-1]
+        lines = {id: [] for id in ids}
+        for row in db.session.execute(
+            select(Order.transaction_id, Order.product_id, Order.quantity, Order.price)
+            .where(Order.transaction_id.in_(ids))
+            .order_by(Order.id)
+        ):
+            lines[row.transaction_id].append([row.product_id, row.quantity, row.price])
+        try:
+            statement = upsert(db.session, ArchivedTransaction)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['id'], set_={'lines': statement.excluded.lines}
+            ), [{
+                'id': transaction.id, 'user_id': transaction.user_id, 'datetime': transaction.datetime,
+                'total': transaction.total, 'lines': json.dumps(lines[transaction.id]),
+            } for transaction in transactions])
+            db.session.commit()
+            db.session.execute(delete(Order).where(Order.transaction_id.in_(ids)))
+            # queued checkouts that placed these transactions keep their status but lose the link
+            db.session.execute(update(CheckoutJob).where(CheckoutJob.transaction_id.in_(ids)).values(transaction_id=None)
+                               .execution_options(synchronize_session=False))
+            db.session.execute(delete(Transaction).where(Transaction.id.in_(ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(ids)
+        if progress:
+            progress(moved)
+
+@click.command('archive-orders')
+@click.option('--days', type=int, help='Archive transactions older than this many days (default ARCHIVE_AFTER_DAYS).')
+@click.option('--batch', default=ARCHIVE_BATCH, help='Transactions per batch.')
+@with_appcontext
+def archive_command(days, batch):
+    '''Move old transactions and their orders to the archive.'''
+    if days is None:
+        days = current_app.config['ARCHIVE_AFTER_DAYS']
+    before = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    moved = archive(before, batch, lambda moved: click.echo('%d transactions archived' % moved))
+    click.echo('archived %d transactions older than %s' % (moved, before.date()))
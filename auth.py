@@ -0,0 +1,145 @@
+from functools import wraps
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, g
+
+from models import db, User
+from passwords import needs_rehash
+from cache import catalog
+
+bp = Blueprint('auth', __name__)
+
+class SessionUser:
+    '''
+    the parts of a user kept in the signed session cookie. with SESSION_USER_CACHE on,
+    g.user is one of these and pages that only need to know who is logged in
+    don't touch the database at all.
+    '''
+    def __init__(self, data):
+        self.id = data['id']
+        self.username = data['username']
+        self.name = data['name']
+        self.is_admin = data['is_admin']
+
+def remember_user(user):
+    session['user_id'] = user.id
+    session['user'] = {'id': user.id, 'username': user.username, 'name': user.name, 'is_admin': user.is_admin}
+
+@bp.before_app_request
+def load_user():
+    g.user = None
+    if 'user_id' not in session or request.endpoint == 'static':
+        return
+    if current_app.config['SESSION_USER_CACHE'] and 'user' in session:
+        g.user = SessionUser(session['user'])
+        return
+    g.user = User.query.get(session['user_id'])
+    if not g.user:
+        # the account is gone, treat the session as logged out
+        session.pop('user_id', None)
+        session.pop('user', None)
+
+def auth_required(func):
+    @wraps(func)
+    def inner(*args, **kwargs):
+        if not g.user:
+            flash('You need to login first.')
+            return redirect(url_for('auth.login'))
+        return func(*args, **kwargs)
+    return inner
+
+def admin_required(func):
+    @wraps(func)
+    def inner(*args, **kwargs):
+        if not g.user:
+            flash('You need to login first.')
+            return redirect(url_for('auth.login'))
+        if not g.user.is_admin:
+            flash('You are not authorized to view this page.')
+            return redirect(url_for('store.index'))
+        return func(*args, **kwargs)
+    return inner
+
+@bp.route('/profile')
+@auth_required
+def profile():
+    return render_template('profile.html', user=User.query.get(session['user_id']))
+
+@bp.route('/profile', methods=['POST'])
+@auth_required
+def profile_post():
+    user = User.query.get(session['user_id'])
+    username = request.form.get('username')
+    name = request.form.get('name')
+    password = request.form.get('password')
+    cpassword = request.form.get('cpassword')
+    if username == '' or password == '' or cpassword == '':
+        flash('Username or password cannot be empty.')
+        return redirect(url_for('auth.profile'))
+    if not user.check_password(cpassword):
+        flash('Incorrect password.')
+        return redirect(url_for('auth.profile'))
+    if User.query.filter_by(username=username).first() and username != user.username:
+        flash('User with this username already exists. Please choose some other username')
+        return redirect(url_for('auth.profile'))
+    user.username = username
+    user.name = name
+    # cpassword was just checked, so if they match the stored hash is already right
+    if password != cpassword:
+        user.password = password
+    db.session.commit()
+    remember_user(user)
+    catalog.bump_user(user.id)
+    flash('Profile updated successfully.')
+    return redirect(url_for('auth.profile'))
+
+@bp.route('/login')
+def login():
+    return render_template('login.html')
+
+@bp.route('/login', methods=['POST'])
+def login_post():
+    username = request.form.get('username')
+    password = request.form.get('password')
+    if username == '' or password == '':
+        flash('Username or password cannot be empty.')
+        return redirect(url_for('auth.login'))
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        flash('User does not exist.')
+        return redirect(url_for('auth.login'))
+    if not user.check_password(password):
+        flash('Incorrect password.')
+        return redirect(url_for('auth.login'))
+    # login successful
+    if needs_rehash(user.passhash):
+        # upgrade hashes made with older settings while we have the plain password
+        user.password = password
+        db.session.commit()
+    remember_user(user)
+    return redirect(url_for('store.index'))
+
+@bp.route('/register')
+def register():
+    return render_template('register.html')
+
+@bp.route('/register', methods=['POST'])
+def register_post():
+    username = request.form.get('username')
+    password = request.form.get('password')
+    name = request.form.get('name')
+    if username == '' or password == '':
+        flash('Username or password cannot be empty.')
+        return redirect(url_for('auth.register'))
+    if User.query.filter_by(username=username).first():
+        flash('User with this username already exists. Please choose some other username')
+        return redirect(url_for('auth.register'))
+    user = User(username=username, password=password, name=name)
+    db.session.add(user)
+    db.session.commit()
+    flash('User successfully registered.')
+    return redirect(url_for('auth.login'))
+
+@bp.route('/logout')
+def logout():
+    session.pop('user_id', None)
+    session.pop('user', None)
+    return redirect(url_for('auth.login'))
@@ -0,0 +1,93 @@
+'''
+multi-threaded checkout stress test against sqlite.
+
+usage: python benchmarks/checkout_bench.py [--threads 8] [--checkouts 50] [--products 5] [--stock 100]
+
+every thread logs in as its own user and keeps adding a few units of a random
+hot product to its cart and checking out, so buyers fight over a small stock.
+reports checkouts per second and verifies that stock never went negative and
+that every unit sold is accounted for by an order line.
+'''
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def main(args):
+    workdir = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'checkout.db')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from migrations import init_db
+    from models import db, User, Product, Category, Order
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        category = Category(name='Hot')
+        db.session.add(category)
+        for i in range(args.products):
+            db.session.add(Product(name='Hot %d' % i, category=category, quantity=args.stock,
+                                   price=10, man_date=datetime.date.today()))
+        for i in range(args.threads):
+            db.session.add(User(username='buyer%d' % i, password='buyer'))
+        db.session.commit()
+        product_ids = [p.id for p in Product.query.all()]
+
+    placed = [0] * args.threads
+    rejected = [0] * args.threads
+    errors = []
+
+    def buyer(n):
+        rng = random.Random(n)
+        client = app.test_client()
+        client.post('/login', data={'username': 'buyer%d' % n, 'password': 'buyer'})
+        for _ in range(args.checkouts):
+            try:
+                product_id = rng.choice(product_ids)
+                client.post('/cart/%d/add' % product_id, data={'quantity': str(rng.randint(1, 3))})
+                response = client.post('/cart/place_order')
+                if response.headers.get('Location', '').endswith('/orders'):
+                    placed[n] += 1
+                else:
+                    rejected[n] += 1
+                    client.post('/cart/%d/delete' % product_id)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=buyer, args=(n,)) for n in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        remaining = db.session.scalar(db.select(db.func.sum(Product.quantity)))
+        lowest = db.session.scalar(db.select(db.func.min(Product.quantity)))
+        sold = db.session.scalar(db.select(db.func.sum(Order.quantity))) or 0
+
+    total = sum(placed)
+    print('threads %d  checkouts placed %d  rejected %d  errors %d' % (args.threads, total, sum(rejected), len(errors)))
+    print('%.1f checkouts/s over %.2fs' % (total / elapsed, elapsed))
+    print('stock: lowest %d  remaining %d  sold %d  initial %d' % (lowest, remaining, sold, args.products * args.stock))
+    assert lowest >= 0, 'stock went negative'
+    assert remaining + sold == args.products * args.stock, 'stock and orders disagree'
+    if errors:
+        raise errors[0]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--checkouts', type=int, default=50)
+    parser.add_argument('--products', type=int, default=5)
+    parser.add_argument('--stock', type=int, default=100)
+    main(parser.parse_args())
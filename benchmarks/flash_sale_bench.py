@@ -0,0 +1,130 @@
+'''
+flash sale: many buyers checking out the same few products at once, with
+checkouts settled synchronously and through the checkout queue.
+
+usage: python benchmarks/flash_sale_bench.py [--buyers 400] [--threads 16] [--products 2] [--stock 300] [--batch 100]
+
+every buyer gets a cart with 1 to 3 units of one of the hot products, then
+--threads client threads check them all out as fast as they can. there is
+less stock than is asked for, so some checkouts fail. each mode runs in its
+own process on a fresh sqlite database. reports settled checkouts per second
+and the p50/p99 time from placing the order to knowing its outcome (the
+request itself for sync, the job's queue time for queued), and verifies that
+stock never went negative and every unit sold has an order line.
+'''
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+def child(args, queued):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(args.workdir, 'flash.db')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from migrations import init_db
+    from models import db, User, Product, Category, Cart, Order, CheckoutJob
+
+    app = create_app({'CHECKOUT_QUEUE': queued, 'CHECKOUT_BATCH': args.batch})
+    rng = random.Random(0)
+    with app.app_context():
+        init_db()
+        category = Category(name='Flash sale')
+        db.session.add(category)
+        products = [Product(name='Deal %d' % n, category=category, quantity=args.stock, price=10, man_date=datetime.date.today())
+                    for n in range(args.products)]
+        db.session.add_all(products)
+        # the password is never checked, buyers are logged in directly below
+        db.session.execute(db.insert(User), [{'username': 'buyer%d' % n, 'passhash': '-', 'name': 'Buyer'}
+                                             for n in range(args.buyers)])
+        db.session.flush()
+        user_ids = db.session.scalars(db.select(User.id).where(User.username.like('buyer%')).order_by(User.id)).all()
+        db.session.execute(db.insert(Cart), [{'user_id': user_id, 'product_id': rng.choice(products).id, 'quantity': rng.randint(1, 3)}
+                                             for user_id in user_ids])
+        db.session.commit()
+
+    # log everyone in before the sale starts
+    clients = []
+    for user_id in user_ids:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+        clients.append(client)
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    def buyer(mine):
+        for client in mine:
+            try:
+                start = time.perf_counter()
+                response = client.post('/cart/place_order')
+                seconds = time.perf_counter() - start
+                # queued checkouts are timed by their job, unless the early stock check answered right away
+                if not (queued and '/checkout/' in response.headers.get('Location', '')):
+                    with lock:
+                        latencies.append(seconds)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=buyer, args=(clients[n::args.threads],)) for n in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with app.app_context():
+        while queued and db.session.scalar(db.select(db.func.count()).where(CheckoutJob.status.in_(['pending', 'processing']))):
+            db.session.rollback()
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        if queued:
+            latencies += [(finished - created).total_seconds() for created, finished in
+                          db.session.execute(db.select(CheckoutJob.created_at, CheckoutJob.finished_at)).all()]
+            placed = db.session.scalar(db.select(db.func.count()).where(CheckoutJob.status == 'done'))
+        else:
+            placed = db.session.scalar(db.select(db.func.count(db.distinct(Order.transaction_id))))
+        remaining = db.session.scalar(db.select(db.func.sum(Product.quantity)))
+        lowest = db.session.scalar(db.select(db.func.min(Product.quantity)))
+        sold = db.session.scalar(db.select(db.func.sum(Order.quantity))) or 0
+    assert lowest >= 0, 'stock went negative'
+    assert remaining + sold == args.products * args.stock, 'stock and orders disagree'
+    if errors:
+        raise errors[0]
+    print(json.dumps({'placed': placed, 'failed': args.buyers - placed, 'seconds': elapsed,
+                      'p50': percentile(latencies, 50), 'p99': percentile(latencies, 99), 'sold': sold}))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--buyers', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--products', type=int, default=2)
+    parser.add_argument('--stock', type=int, default=300)
+    parser.add_argument('--batch', type=int, default=100)
+    parser.add_argument('--child', choices=['sync', 'queued'])
+    parser.add_argument('--workdir')
+    args = parser.parse_args()
+    if args.child:
+        child(args, args.child == 'queued')
+        sys.exit()
+    print('%d buyers, %d threads, %d products with %d units each' % (args.buyers, args.threads, args.products, args.stock))
+    print('    %-8s %8s %8s %10s %9s %9s' % ('mode', 'placed', 'failed', 'orders/s', 'p50 ms', 'p99 ms'))
+    for mode in ['sync', 'queued']:
+        with tempfile.TemporaryDirectory() as workdir:
+            output = subprocess.run([sys.executable, __file__, '--child', mode, '--workdir', workdir] + sys.argv[1:],
+                                    check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        print('    %-8s %8d %8d %10.1f %9.1f %9.1f' % (mode, result['placed'], result['failed'],
+                                                    (result['placed'] + result['failed']) / result['seconds'],
+                                                    result['p50'] * 1000, result['p99'] * 1000))
@@ -0,0 +1,243 @@
+'''
+replay a mix of storefront traffic and report latency and sql counts per route.
+
+usage: python benchmarks/load.py [--requests 2000] [--workers 4] [--users 200] [--products 1000] [--seed 0]
+                                 [--url http://127.0.0.1:5000] [--output run.json] [--compare previous.json]
+
+by default the app runs in this process, on a fresh sqlite database filled by
+seed.py, and is driven through the flask test client. with --url the traffic
+goes to a running server instead; fill its database with seed.py first (using
+the same --users) and start it with QUERY_COUNT_HEADER=1 to get sql counts.
+
+every worker logs in as its own seeded user and then sends its share of
+--requests, picking browse, search, add to cart, cart, checkout and order
+history requests at random with the weights in ACTIONS. the same --seed
+replays the same requests. --output writes the results as json, and
+--compare prints how they changed against an earlier --output file.
+'''
+import argparse
+import datetime
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ['apple', 'milk', 'bread', 'rice', 'tea', 'mango', 'oats', 'juice', 'ginger', 'xyz']
+
+## traffic
+
+def browse(rng, args):
+    return 'GET', '/', None
+
+def browse_page(rng, args):
+    return 'GET', '/?after=%d' % rng.randint(1, args.categories), None
+
+def search(rng, args):
+    parameter = rng.choice(['product', 'product', 'category', 'price'])
+    query = str(rng.randint(5, 500)) if parameter == 'price' else rng.choice(WORDS)
+    return 'GET', '/?' + urllib.parse.urlencode({'parameter': parameter, 'query': query}), None
+
+def add_to_cart(rng, args):
+    lines = [{'product_id': rng.randint(1, args.products), 'quantity': 1} for _ in range(rng.randint(1, 5))]
+    return 'POST', '/cart/update', {'lines': lines, 'add': True}
+
+def view_cart(rng, args):
+    return 'GET', '/cart', None
+
+def checkout(rng, args):
+    return 'POST', '/cart/place_order', None
+
+def orders(rng, args):
+    return 'GET', '/orders', None
+
+# (name, weight, request)
+ACTIONS = [
+    ('browse', 25, browse),
+    ('browse next page', 10, browse_page),
+    ('search', 20, search),
+    ('add to cart', 20, add_to_cart),
+    ('cart', 10, view_cart),
+    ('checkout', 5, checkout),
+    ('order history', 10, orders),
+]
+
+## clients
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, form=None):
+        response = self.client.open(path, method=method, json=body, data=form)
+        # read streamed responses to the end
+        response.get_data()
+        return response.status_code, response.headers.get('X-Query-Count')
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class LiveClient:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+
+    def request(self, method, path, body=None, form=None):
+        headers = {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode()
+        request = urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status, response.headers.get('X-Query-Count')
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code, error.headers.get('X-Query-Count')
+
+## running
+
+def worker(n, client, args, results, lock):
+    rng = random.Random('%d-%d' % (args.seed, n))
+    status, _ = client.request('POST', '/login', form={'username': 'user%d' % (n % args.users), 'password': 'password'})
+    if status != 302:
+        raise RuntimeError('user%d could not log in (%d)' % (n % args.users, status))
+    names = [name for name, weight, request in ACTIONS]
+    weights = [weight for name, weight, request in ACTIONS]
+    requests = dict((name, request) for name, weight, request in ACTIONS)
+    mine = []
+    for _ in range(args.requests // args.workers):
+        name = rng.choices(names, weights)[0]
+        method, path, body = requests[name](rng, args)
+        start = time.perf_counter()
+        status, queries = client.request(method, path, body)
+        mine.append((name, (time.perf_counter() - start) * 1000, status, int(queries) if queries else None))
+    with lock:
+        results.extend(mine)
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+def summarize(results, seconds):
+    routes = {}
+    for name, weight, request in ACTIONS:
+        latencies = [ms for route, ms, status, queries in results if route == name]
+        if not latencies:
+            continue
+        queries = [queries for route, ms, status, queries in results if route == name and queries is not None]
+        statuses = {}
+        for route, ms, status, _ in results:
+            if route == name:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+        routes[name] = {
+            'requests': len(latencies),
+            'throughput': len(latencies) / seconds,
+            'mean_ms': statistics.mean(latencies),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'queries_mean': statistics.mean(queries) if queries else None,
+            'queries_max': max(queries) if queries else None,
+            'statuses': statuses,
+        }
+    return {
+        'requests': len(results),
+        'seconds': seconds,
+        'throughput': len(results) / seconds,
+        'errors': sum(1 for route, ms, status, queries in results if status >= 500),
+        'routes': routes,
+    }
+
+def setup_app(args, workdir):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'load.db')
+    os.environ.setdefault('SECRET_KEY', 'load')
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from migrations import init_db
+    from seed import seed
+
+    app = create_app({'QUERY_COUNT_HEADER': True})
+    with app.app_context():
+        init_db()
+        seed(args.users, args.categories, args.products, seed=args.seed)
+    return app
+
+def run(args, workdir):
+    if args.url:
+        clients = [LiveClient(args.url) for _ in range(args.workers)]
+    else:
+        app = setup_app(args, workdir)
+        clients = [TestClient(app) for _ in range(args.workers)]
+    results = []
+    lock = threading.Lock()
+    threads = [threading.Thread(target=worker, args=(n, clients[n], args, results, lock)) for n in range(args.workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = summarize(results, time.perf_counter() - start)
+    summary['mode'] = 'live' if args.url else 'in-process'
+    summary['started'] = datetime.datetime.now().isoformat(timespec='seconds')
+    summary['args'] = {name: getattr(args, name) for name in ('requests', 'workers', 'users', 'categories', 'products', 'seed', 'url')}
+    return summary
+
+## reporting
+
+def change(new, old):
+    if new is None or not old:
+        return ''
+    return '%+.0f%%' % ((new - old) / old * 100)
+
+def report(summary, previous=None):
+    print('%d requests in %.1fs, %.1f requests/s, %d errors (%s)' % (
+        summary['requests'], summary['seconds'], summary['throughput'], summary['errors'], summary['mode']))
+    print('    %-18s %8s %9s %9s %9s %8s' % ('route', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+    for name, route in summary['routes'].items():
+        queries = '-' if route['queries_mean'] is None else '%.1f' % route['queries_mean']
+        print('    %-18s %8.1f %9.2f %9.2f %9.2f %8s' % (
+            name, route['throughput'], route['p50_ms'], route['p95_ms'], route['p99_ms'], queries))
+        old = (previous or {}).get('routes', {}).get(name)
+        if old:
+            print('    %-18s %8s %9s %9s %9s %8s' % (
+                '  vs previous', change(route['throughput'], old['throughput']), change(route['p50_ms'], old['p50_ms']),
+                change(route['p95_ms'], old['p95_ms']), change(route['p99_ms'], old['p99_ms']),
+                change(route['queries_mean'], old['queries_mean'])))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url')
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+    with tempfile.TemporaryDirectory() as workdir:
+        summary = run(args, workdir)
+    report(summary, previous)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(summary, file, indent=2)
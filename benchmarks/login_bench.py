@@ -0,0 +1,82 @@
+'''
+login throughput and latency for each password hashing setting.
+
+usage: python benchmarks/login_bench.py [--methods pbkdf2:sha256:600000,pbkdf2:sha256:100000,scrypt]
+                                        [--workers 0,4] [--threads 8] [--logins 20]
+
+every combination of hash method and PASSWORD_HASH_WORKERS runs in its own
+process against a fresh sqlite database; --threads concurrent clients each
+log in --logins times and we report logins per second and p50/p99 latency.
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+def child(threads, logins):
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from migrations import init_db
+    from models import db, User
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        for n in range(threads):
+            db.session.add(User(username='user%d' % n, password='secret'))
+        db.session.commit()
+
+    latencies = []
+    lock = threading.Lock()
+
+    def client(n):
+        client = app.test_client()
+        mine = []
+        for _ in range(logins):
+            start = time.perf_counter()
+            response = client.post('/login', data={'username': 'user%d' % n, 'password': 'secret'})
+            mine.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 302
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    print('%-24s workers %-3s %7.1f logins/s  p50 %8.1fms  p99 %8.1fms' % (
+        app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'] or '-',
+        len(latencies) / elapsed, statistics.median(latencies), percentile(latencies, 99)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--methods', default='pbkdf2:sha256:600000,pbkdf2:sha256:100000,scrypt')
+    parser.add_argument('--workers', default='0,4')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=20)
+    parser.add_argument('--child', action='store_true')
+    args = parser.parse_args()
+    if args.child:
+        child(args.threads, args.logins)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            for method in args.methods.split(','):
+                for workers in args.workers.split(','):
+                    env = dict(os.environ,
+                               SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(workdir, 'login_%s_%s.db' % (method.replace(':', '_'), workers)),
+                               SECRET_KEY='bench', PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=workers)
+                    subprocess.run([sys.executable, __file__, '--child', '--threads', str(args.threads),
+                                    '--logins', str(args.logins)], env=env, check=True)
@@ -0,0 +1,66 @@
+'''
+bytes sent and time taken for the storefront page, plain, compressed and revalidated.
+
+usage: python benchmarks/page_weight_bench.py [--categories 20] [--products 2000] [--requests 50]
+
+seeds a fresh sqlite database with seed.py, logs in as a seeded user and
+fetches / (the first page of categories) --requests times without
+Accept-Encoding, with gzip (and brotli if the package is installed), and
+with If-None-Match set to the page's etag. uses the sqlite catalog cache,
+pages have no etag with the local one.
+'''
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure(client, requests, headers):
+    times, size, status = [], 0, None
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get('/', headers=headers)
+        size = len(response.get_data())
+        times.append((time.perf_counter() - start) * 1000)
+        status = response.status_code
+    return status, size, statistics.median(times)
+
+def main(args, workdir):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'weight.db')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    # pages only get etags with a shared catalog cache
+    os.environ['CATALOG_CACHE_BACKEND'] = 'sqlite'
+    os.environ['CATALOG_CACHE_PATH'] = os.path.join(workdir, 'cache.db')
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from migrations import init_db
+    from seed import seed
+    import responses
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        seed(users=1, categories=args.categories, products=args.products, orders_per_user=0)
+    client = app.test_client()
+    client.post('/login', data={'username': 'user0', 'password': 'password'})
+    etag = client.get('/').headers['ETag']
+    runs = [('plain', {}), ('gzip', {'Accept-Encoding': 'gzip'})]
+    if responses.brotli:
+        runs.append(('brotli', {'Accept-Encoding': 'br'}))
+    runs.append(('revalidated', {'If-None-Match': etag}))
+    print('    %-12s %7s %10s %10s' % ('', 'status', 'bytes', 'median ms'))
+    for name, headers in runs:
+        status, size, ms = measure(client, args.requests, headers)
+        print('    %-12s %7d %10d %10.2f' % (name, status, size, ms))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        main(args, workdir)
@@ -0,0 +1,101 @@
+'''
+time the admin reorder report over a large catalog.
+
+usage: python benchmarks/reorder_bench.py [--products 100000] [--categories 200] [--days 365] [--density 0.1]
+
+fills a fresh sqlite database with --products products and a year of daily
+sales rollups, where each product sold something on about --density of the
+days, then times the report over a --days window: computed from scratch,
+served from the cache, and after a checkout changed one category (only
+that category is recomputed). also times the per product arithmetic done
+with numpy against the same arithmetic in a python loop.
+'''
+import argparse
+import datetime
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH = 50000
+
+def python_reorders(stock, sold, sold_squares, window):
+    # what compute_reorders does, one product at a time
+    from reorder import LEAD_DAYS, COVER_DAYS, SAFETY_FACTOR
+    results = []
+    for quantity, total, squares in zip(stock, sold, sold_squares):
+        demand = total / window
+        safety = SAFETY_FACTOR * math.sqrt(max(squares / window - demand * demand, 0) * LEAD_DAYS)
+        reorder_point = demand * LEAD_DAYS + safety
+        days_left = quantity / demand if demand > 0 else math.inf
+        suggested = max(math.ceil(demand * (LEAD_DAYS + COVER_DAYS) + safety - quantity), 0) if quantity <= reorder_point else 0
+        results.append((demand, days_left, reorder_point, suggested))
+    return results
+
+def main(args, workdir):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'reorder.db')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from migrations import init_db
+    from models import db, Category, Product, DailyProductSales
+    from cache import catalog
+    from reorder import reorder_report, compute_reorders
+    import numpy as np
+
+    app = create_app()
+    rng = random.Random(0)
+    today = datetime.datetime.utcnow().date()
+    with app.app_context():
+        init_db()
+        start = time.perf_counter()
+        db.session.execute(db.insert(Category), [{'name': 'Category %d' % n} for n in range(args.categories)])
+        db.session.execute(db.insert(Product), [{
+            'name': 'Product %d' % n, 'category_id': n % args.categories + 1, 'quantity': rng.randint(0, 200),
+            'price': 10, 'man_date': today,
+        } for n in range(args.products)])
+        rows = []
+        for day in range(365):
+            for product_id in rng.sample(range(1, args.products + 1), int(args.products * args.density)):
+                quantity = rng.randint(1, 10)
+                rows.append({'day': today - datetime.timedelta(days=day), 'product_id': product_id,
+                             'quantity': quantity, 'revenue': quantity * 10, 'orders': 1})
+            if len(rows) >= BATCH:
+                db.session.execute(db.insert(DailyProductSales), rows)
+                rows = []
+        if rows:
+            db.session.execute(db.insert(DailyProductSales), rows)
+        db.session.commit()
+        total_rows = db.session.scalar(db.select(db.func.count()).select_from(DailyProductSales))
+        print('%d products, %d rollup rows, filled in %.1fs' % (args.products, total_rows, time.perf_counter() - start))
+
+    with app.test_request_context():
+        for name, setup in [('cold', None), ('cached', None), ('one category changed', lambda: catalog.bump_categories([1]))]:
+            if setup:
+                setup()
+            start = time.perf_counter()
+            rows, total = reorder_report(args.days)
+            print('    %-22s %8.3fs  %d products to reorder' % (name, time.perf_counter() - start, total))
+
+    stock = np.array([rng.randint(0, 200) for _ in range(args.products)], dtype=np.float64)
+    sold = np.array([rng.randint(0, 1000) for _ in range(args.products)], dtype=np.float64)
+    sold_squares = sold * 10
+    start = time.perf_counter()
+    compute_reorders(stock, sold, sold_squares, args.days)
+    print('    %-22s %8.3fs' % ('numpy arithmetic', time.perf_counter() - start))
+    start = time.perf_counter()
+    python_reorders(stock.tolist(), sold.tolist(), sold_squares.tolist(), args.days)
+    print('    %-22s %8.3fs' % ('python loop', time.perf_counter() - start))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--categories', type=int, default=200)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--density', type=float, default=0.1)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        main(args, workdir)
@@ -0,0 +1,107 @@
+'''
+sales dashboard latency against order history size.
+
+usage: python benchmarks/sales_bench.py [--sizes 10000,100000,1000000] [--repeat 20]
+
+every size gets a fresh sqlite database with that many order lines spread
+over a year, the rollups are rebuilt with the backfill, and then the
+dashboard is timed against the same report computed from the order table.
+'''
+import argparse
+import datetime
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def seed(db, models, size, categories=20, products=500, lines=3, batch=10000):
+    rng = random.Random(size)
+    db.session.execute(db.insert(models.User), [{'username': 'buyer', 'passhash': '-'}])
+    db.session.execute(db.insert(models.Category), [{'name': 'Category %d' % i} for i in range(categories)])
+    db.session.execute(db.insert(models.Product), [{
+        'name': 'Product %d' % i, 'category_id': rng.randint(1, categories), 'quantity': 100,
+        'price': round(rng.uniform(1, 500), 2), 'man_date': datetime.date.today(),
+    } for i in range(products)])
+    now = datetime.datetime.utcnow()
+    for start in range(0, size // lines, batch):
+        ids = range(start + 1, min(start + batch, size // lines) + 1)
+        db.session.execute(db.insert(models.Transaction), [{
+            'id': id, 'user_id': 1, 'total': 0, 'datetime': now - datetime.timedelta(seconds=rng.randint(0, 365 * 86400)),
+        } for id in ids])
+        db.session.execute(db.insert(models.Order), [{
+            'transaction_id': id, 'product_id': rng.randint(1, products), 'quantity': rng.randint(1, 5),
+            'price': round(rng.uniform(1, 500), 2),
+        } for id in ids for _ in range(lines)])
+    db.session.commit()
+
+def from_orders(db, models, days=14):
+    # the same report without rollups
+    start = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+    Order, Product, Transaction = models.Order, models.Product, models.Transaction
+    per_day = db.session.execute(
+        db.select(db.func.date(Transaction.datetime), Product.category_id, db.func.sum(Order.quantity * Order.price))
+        .join(Order, Order.transaction_id == Transaction.id)
+        .join(Product, Product.id == Order.product_id)
+        .where(Transaction.datetime >= start)
+        .group_by(db.func.date(Transaction.datetime), Product.category_id)
+    ).all()
+    top = db.session.execute(
+        db.select(Order.product_id, db.func.sum(Order.quantity * Order.price).label('revenue'))
+        .join(Transaction, Transaction.id == Order.transaction_id)
+        .where(Transaction.datetime >= start + datetime.timedelta(days=7))
+        .group_by(Order.product_id)
+        .order_by(db.desc('revenue'))
+        .limit(10)
+    ).all()
+    return per_day, top
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+def run(size, repeat, workdir):
+    db_path = os.path.join(workdir, 'sales_%d.db' % size)
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI='sqlite:///' + db_path, SECRET_KEY='bench')
+    subprocess.run([sys.executable, __file__, '--child', str(size), '--repeat', str(repeat)], env=env, check=True)
+
+def child(size, repeat):
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from migrations import init_db
+    import models
+    from models import db
+    from sales import backfill, sales_dashboard
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        start = time.perf_counter()
+        seed(db, models, size)
+        seeded = time.perf_counter()
+        backfill()
+        print('%9d order lines  seeded in %.1fs  backfilled in %.1fs' % (size, seeded - start, time.perf_counter() - seeded))
+        for name, fn in [('dashboard (rollups)', sales_dashboard), ('same report from orders', lambda: from_orders(db, models))]:
+            median, worst = timed(fn, repeat)
+            print('    %-24s median %8.2fms  max %8.2fms' % (name, median, worst))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--child', type=int)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            for size in args.sizes.split(','):
+                run(int(size), args.repeat, workdir)
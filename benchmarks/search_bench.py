@@ -0,0 +1,93 @@
+'''
+storefront search latency against catalog size.
+
+usage: python benchmarks/search_bench.py [--sizes 1000,100000,1000000] [--repeat 20]
+
+every size gets a fresh sqlite database in a temp directory, filled with
+bulk inserts, and then each search mode is timed through search.py.
+'''
+import argparse
+import datetime
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = ['apple', 'banana', 'carrot', 'milk', 'bread', 'cheese', 'rice', 'tomato', 'onion', 'butter',
+         'yogurt', 'lentil', 'spinach', 'mango', 'grape', 'potato', 'flour', 'sugar', 'salt', 'tea']
+
+def seed(db, Product, Category, size, categories=50, batch=10000):
+    rng = random.Random(size)
+    db.session.execute(db.insert(Category), [{'name': 'Category %s %d' % (rng.choice(WORDS), i)} for i in range(categories)])
+    today = datetime.date.today()
+    for start in range(0, size, batch):
+        rows = [{
+            'name': '%s %s %d' % (rng.choice(WORDS), rng.choice(WORDS), i),
+            'category_id': rng.randint(1, categories),
+            'quantity': rng.randint(0, 100),
+            'price': round(rng.uniform(1, 500), 2),
+            'man_date': today,
+        } for i in range(start, min(start + batch, size))]
+        db.session.execute(db.insert(Product), rows)
+    db.session.commit()
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+def run(size, repeat, workdir):
+    # every size runs in its own interpreter, so memory held by one size
+    # doesn't slow down the next
+    db_path = os.path.join(workdir, 'search_%d.db' % size)
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI='sqlite:///' + db_path, SECRET_KEY='bench')
+    subprocess.run([sys.executable, __file__, '--child', str(size), '--repeat', str(repeat)], env=env, check=True)
+
+def child(size, repeat):
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from migrations import init_db
+    from models import db, Product, Category, search_index_available
+    from search import browse_categories, category_products, search_products
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        start = time.perf_counter()
+        seed(db, Product, Category, size)
+        print('%9d products  seeded in %.1fs  (fts5: %s)' % (size, time.perf_counter() - start, search_index_available()))
+        cases = [
+            # a storefront page: a page of categories and the first products of each
+            ('browse', lambda: category_products([category.id for category in browse_categories()[0]])),
+            ('one category', lambda: search_products('category_id', 1)),
+            ('product name', lambda: search_products('product', 'spinach')),
+            ('product name, 2 chars', lambda: search_products('product', 'sp')),
+            ('category name', lambda: search_products('category', 'mango')),
+            ('max price', lambda: search_products('price', 50.0)),
+            ('max price, page 2', lambda: search_products('price', 50.0, after=search_products('price', 50.0)[1])),
+            # prices start at 1, so this matches a handful of products
+            ('max price, selective', lambda: search_products('price', 1.01)),
+        ]
+        for name, fn in cases:
+            median, worst = timed(lambda: (fn(), db.session.expunge_all()), repeat)
+            print('    %-24s median %8.2fms  max %8.2fms' % (name, median, worst))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--child', type=int)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            for size in args.sizes.split(','):
+                run(int(size), args.repeat, workdir)
@@ -0,0 +1,101 @@
+'''
+fill a database with synthetic but realistic looking store data.
+
+usage: python benchmarks/seed.py [--users 1000] [--categories 20] [--products 2000] [--seed 0]
+
+uses SQLALCHEMY_DATABASE_URI like the app and expects a new database. the
+same arguments always give the same data. users are user0, user1, ... with
+the password 'password'. about a fifth of them have something in their cart, and every user has a history of
+transactions over the past year (on average --orders-per-user, with 1 to 8
+lines each). the sales rollups are rebuilt at the end.
+'''
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = 'password'
+WORDS = ['apple', 'banana', 'carrot', 'milk', 'bread', 'cheese', 'rice', 'tomato', 'onion', 'butter',
+         'yogurt', 'lentil', 'spinach', 'mango', 'grape', 'potato', 'flour', 'sugar', 'salt', 'tea',
+         'coffee', 'honey', 'oats', 'pepper', 'garlic', 'ginger', 'lemon', 'paneer', 'juice', 'eggs']
+BATCH = 10000
+
+def insert(db, model, rows):
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(db.insert(model), rows[start:start + BATCH])
+
+def seed(users=1000, categories=20, products=2000, orders_per_user=5, seed=0):
+    '''fill the current app's database, fresh from init_db. returns the number of rows added per table'''
+    import models
+    from models import db
+    from passwords import hash_password
+    from sales import backfill
+
+    rng = random.Random(seed)
+    passhash = hash_password(PASSWORD)
+    # init_db already created the admin
+    first_user = (db.session.scalar(db.select(db.func.max(models.User.id))) or 0) + 1
+    insert(db, models.User, [{'username': 'user%d' % n, 'passhash': passhash, 'name': 'User %d' % n} for n in range(users)])
+    insert(db, models.Category, [{'name': '%s %d' % (rng.choice(WORDS).title(), n)} for n in range(categories)])
+    today = datetime.date.today()
+    prices = [round(rng.lognormvariate(4, 1), 2) for _ in range(products)]
+    insert(db, models.Product, [{
+        'name': '%s %s %d' % (rng.choice(WORDS).title(), rng.choice(WORDS), n),
+        'category_id': rng.randint(1, categories),
+        'quantity': 0 if rng.random() < 0.1 else rng.randint(1, 500),
+        'price': prices[n],
+        'man_date': today - datetime.timedelta(days=rng.randint(0, 180)),
+    } for n in range(products)])
+    db.session.commit()
+
+    # a few products sell much more than the rest
+    weights = [1 / (n + 1) for n in range(products)]
+    user_ids = range(first_user, first_user + users)
+    carts = []
+    for user_id in rng.sample(user_ids, users // 5):
+        for product_id in set(rng.choices(range(1, products + 1), weights, k=rng.randint(1, 10))):
+            carts.append({'user_id': user_id, 'product_id': product_id, 'quantity': rng.randint(1, 3)})
+    insert(db, models.Cart, carts)
+
+    now = datetime.datetime.utcnow()
+    transactions, orders = [], []
+    for user_id in user_ids:
+        for _ in range(rng.randint(0, orders_per_user * 2)):
+            id = len(transactions) + 1
+            lines = set(rng.choices(range(1, products + 1), weights, k=rng.randint(1, 8)))
+            total = 0
+            for product_id in lines:
+                quantity = rng.randint(1, 4)
+                total += quantity * prices[product_id - 1]
+                orders.append({'transaction_id': id, 'product_id': product_id, 'quantity': quantity, 'price': prices[product_id - 1]})
+            transactions.append({'id': id, 'user_id': user_id, 'total': total,
+                                 'datetime': now - datetime.timedelta(seconds=rng.randint(0, 365 * 86400))})
+    insert(db, models.Transaction, transactions)
+    insert(db, models.Order, orders)
+    db.session.commit()
+    backfill()
+    return {'users': users, 'categories': categories, 'products': products, 'cart lines': len(carts),
+            'transactions': len(transactions), 'orders': len(orders)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--orders-per-user', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from migrations import init_db
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        start = time.perf_counter()
+        counts = seed(args.users, args.categories, args.products, args.orders_per_user, args.seed)
+        print(', '.join('%d %s' % (count, name) for name, count in counts.items()) + ' in %.1fs' % (time.perf_counter() - start))
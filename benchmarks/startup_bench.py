@@ -0,0 +1,80 @@
+'''
+how long a worker takes to start serving.
+
+usage: python benchmarks/startup_bench.py [--workers 1,4,16]
+
+the database is set up once with init_db, then for each count that many
+worker processes start at the same time, like a preforking server booting.
+each one reports how long importing the app, create_app() and its first
+two requests took (a page that needs no database and one that does).
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def setup():
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from migrations import init_db
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+
+def child():
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+    client = app.test_client()
+    assert client.get('/login').status_code == 200
+    first = time.perf_counter()
+    assert client.get('/api/v1/categories').status_code == 200
+    second = time.perf_counter()
+    print(json.dumps({
+        'import': (imported - start) * 1000,
+        'create_app': (created - imported) * 1000,
+        'first request': (first - created) * 1000,
+        'first db request': (second - first) * 1000,
+        'total': (second - start) * 1000,
+    }))
+
+def run(workers, env):
+    children = [subprocess.Popen([sys.executable, __file__, '--child'], env=env, stdout=subprocess.PIPE, text=True)
+                for _ in range(workers)]
+    results = []
+    for process in children:
+        out, _ = process.communicate()
+        if process.returncode:
+            sys.exit('a worker failed to start')
+        results.append(json.loads(out))
+    print('%d worker(s) starting at once' % workers)
+    for name in results[0]:
+        samples = [result[name] for result in results]
+        print('    %-18s median %8.1fms  max %8.1fms' % (name, statistics.median(samples), max(samples)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', default='1,4,16')
+    parser.add_argument('--setup', action='store_true')
+    parser.add_argument('--child', action='store_true')
+    args = parser.parse_args()
+    if args.setup:
+        setup()
+    elif args.child:
+        child()
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ, SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(workdir, 'startup.db'), SECRET_KEY='bench')
+            subprocess.run([sys.executable, __file__, '--setup'], env=env, check=True)
+            for workers in args.workers.split(','):
+                run(int(workers), env)
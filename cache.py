@@ -0,0 +1,247 @@
+import datetime
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, has_request_context
+from werkzeug.local import LocalProxy
+
+## backends
+# a backend stores pickleable values with LRU + TTL eviction, and integer
+# counters (used for versions) that are never evicted. scope() names the
+# store its counters live in, so validators built from versions (etags) can
+# never match between two stores that count from 0 on their own. only a
+# shared backend sees every worker's bumps, so only a shared backend's
+# versions can say that nothing changed.
+
+class LocalCache:
+    '''in-process cache, each worker process has its own copy'''
+    shared = False
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.token = secrets.token_hex(4)
+
+    def scope(self):
+        # forked workers start with a copy of the same cache, the pid tells them apart
+        return '%s%x' % (self.token, os.getpid())
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_counter(self, key):
+        return self.counters.get(key, 0)
+
+    def set_counter(self, key, value):
+        with self.lock:
+            self.counters[key] = value
+
+    def incr(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+            return self.counters[key]
+
+class SqliteCache:
+    '''cache in a sqlite file, shared by every worker process on the machine'''
+    shared = True
+
+    def __init__(self, path, max_entries=1024, ttl=300):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires REAL, accessed REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO counters (key, value) VALUES (?, ?)', ('store:id', secrets.randbits(31)))
+            conn.execute('INSERT OR IGNORE INTO counters (key, value) VALUES (?, ?)', ('store:created', int(time.time())))
+        self.id = self.get_counter('store:id')
+        self.created = self.get_counter('store:created')
+
+    def scope(self):
+        # the same for every worker using the file, new when the file is recreated
+        return '%x' % self.id
+
+    def connect(self):
+        # sqlite connections can't be shared between threads
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self.connect()
+        now = time.time()
+        row = conn.execute('SELECT value, accessed FROM entries WHERE key = ? AND expires > ?', (key, now)).fetchone()
+        if row is None:
+            return None
+        # refreshing the LRU position is a write, so do it at most once a second per key
+        if row[1] < now - 1:
+            conn.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        conn = self.connect()
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO entries (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                     (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + self.ttl, now))
+        conn.execute('DELETE FROM entries WHERE expires <= ?', (now,))
+        conn.execute('''DELETE FROM entries WHERE key IN (
+            SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)''', (self.max_entries,))
+
+    def get_counter(self, key):
+        row = self.connect().execute('SELECT value FROM counters WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def set_counter(self, key, value):
+        self.connect().execute('INSERT OR REPLACE INTO counters (key, value) VALUES (?, ?)', (key, value))
+
+    def incr(self, key):
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT INTO counters (key, value) VALUES (?, 1) ON CONFLICT (key) DO UPDATE SET value = value + 1', (key,))
+            value = conn.execute('SELECT value FROM counters WHERE key = ?', (key,)).fetchone()[0]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+## catalog cache
+
+class CatalogCache:
+    '''
+    read cache for catalog data. every key is tagged with the catalog version,
+    so bumping the version after a write makes all older entries unreachable
+    and they age out through LRU/TTL.
+    '''
+    VERSION_KEY = 'catalog:version'
+    # unix time of the last bump, a counter so it is never evicted
+    MODIFIED_KEY = 'catalog:modified'
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def version(self):
+        # read the version once per request so a page sees a consistent catalog
+        if has_request_context():
+            if 'catalog_version' not in g:
+                g.catalog_version = self.backend.get_counter(self.VERSION_KEY)
+            return g.catalog_version
+        return self.backend.get_counter(self.VERSION_KEY)
+
+    @property
+    def shared(self):
+        '''whether versions change for writes made by any worker, which validators (etags) rely on'''
+        return self.backend.shared
+
+    def scope(self):
+        '''goes into etags next to the versions, see the backends'''
+        return self.backend.scope()
+
+    def bump(self):
+        version = self.backend.incr(self.VERSION_KEY)
+        # stamped after the version moves, so the old version is never served with the new stamp
+        self.backend.set_counter(self.MODIFIED_KEY, int(time.time()))
+        if has_request_context():
+            g.catalog_version = version
+        return version
+
+    def last_modified(self):
+        '''when the catalog last changed, None unless the backend is shared'''
+        if not self.shared:
+            return None
+        stamp = self.backend.get_counter(self.MODIFIED_KEY) or self.backend.created
+        return datetime.datetime.fromtimestamp(stamp, datetime.timezone.utc)
+
+    def get_or_set(self, name, load):
+        key = 'catalog:%d:%s' % (self.version(), name)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = load()
+        self.backend.set(key, value)
+        return value
+
+    def category_version(self, category_id):
+        # content version of one category's products, for caching its rendered product list
+        return self.backend.get_counter('category:%d:version' % category_id)
+
+    def bump_categories(self, category_ids):
+        for category_id in set(category_ids):
+            self.backend.incr('category:%d:version' % category_id)
+
+    def user_version(self, user_id):
+        # version of what a user's own pages show besides the catalog: their cart, orders and profile
+        return self.backend.get_counter('user:%d:version' % user_id)
+
+    def bump_user(self, user_id):
+        self.backend.incr('user:%d:version' % user_id)
+
+    def get_many_or_set(self, keys, load):
+        '''
+        like get_or_set for several entries at once. keys is a list of names,
+        load gets the names that missed and returns a dict of name -> value.
+        these keys are not tagged with the catalog version, version them yourself.
+        '''
+        values = {}
+        for key in keys:
+            value = self.backend.get(key)
+            if value is not None:
+                self.hits += 1
+                values[key] = value
+        missing = [key for key in keys if key not in values]
+        if missing:
+            self.misses += len(missing)
+            loaded = load(missing)
+            for key in missing:
+                self.backend.set(key, loaded[key])
+            values.update(loaded)
+        return values
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'version': self.version()}
+
+def make_backend(config):
+    options = {'max_entries': config['CATALOG_CACHE_SIZE'], 'ttl': config['CATALOG_CACHE_TTL']}
+    if config['CATALOG_CACHE_BACKEND'] == 'sqlite':
+        return SqliteCache(config['CATALOG_CACHE_PATH'], **options)
+    return LocalCache(**options)
+
+def init_app(app):
+    app.extensions['catalog_cache'] = CatalogCache(make_backend(app.config))
+
+# the current app's catalog cache
+catalog = LocalProxy(lambda: current_app.extensions['catalog_cache'])
@@ -0,0 +1,66 @@
+from sqlalchemy import select, delete, and_
+
+from models import db, Product, Cart
+from database import upsert
+from cache import catalog
+
+MAX_LINES = 500
+
+def parse_lines(lines, add):
+    '''
+    [{"product_id": 1, "quantity": 2}, ...] -> ({product_id: quantity}, None) or (None, error message).
+    lines for the same product are summed. when setting, quantity 0 removes the line
+    '''
+    if not isinstance(lines, list) or not lines:
+        return None, 'lines must be a non empty list.'
+    if len(lines) > MAX_LINES:
+        return None, 'Cannot change more than %d lines at once.' % MAX_LINES
+    quantities = {}
+    for line in lines:
+        product_id = line.get('product_id') if isinstance(line, dict) else None
+        quantity = line.get('quantity') if isinstance(line, dict) else None
+        if not isinstance(product_id, int) or not isinstance(quantity, int) or quantity < (1 if add else 0):
+            return None, 'Every line needs an integer product_id and a quantity ' + ('greater than 0.' if add else 'of 0 or more.')
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities, None
+
+def update_cart(user_id, quantities, add=False):
+    '''
+    set (or with add, increase) the cart quantities of many products at once.
+    stock and the current cart are read with one query and the changes are
+    written with one upsert, so the cost doesn't grow with the number of lines.
+    either every line is applied or, if any is invalid, none are.
+    returns a list of {"product_id", "message"} errors, empty on success
+    '''
+    rows = db.session.execute(
+        select(Product.id, Product.quantity, Cart.quantity)
+        .outerjoin(Cart, and_(Cart.product_id == Product.id, Cart.user_id == user_id))
+        .where(Product.id.in_(list(quantities)))
+    ).all()
+    stock = {id: (available, in_cart or 0) for id, available, in_cart in rows}
+    errors = []
+    wanted = {}
+    for product_id, quantity in quantities.items():
+        if product_id not in stock:
+            errors.append({'product_id': product_id, 'message': 'Product does not exist.'})
+            continue
+        available, in_cart = stock[product_id]
+        wanted[product_id] = in_cart + quantity if add else quantity
+        if wanted[product_id] > available:
+            errors.append({'product_id': product_id,
+                           'message': 'Quantity must be less than or equal to ' + str(available - (in_cart if add else 0)) + '.'})
+    if errors:
+        return errors
+    lines = [{'user_id': user_id, 'product_id': product_id, 'quantity': quantity}
+             for product_id, quantity in wanted.items() if quantity]
+    if lines:
+        statement = upsert(db.session, Cart)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['user_id', 'product_id'], set_={'quantity': statement.excluded.quantity}
+        ), lines)
+    removed = [product_id for product_id, quantity in wanted.items() if not quantity]
+    if removed:
+        db.session.execute(delete(Cart).where(Cart.user_id == user_id, Cart.product_id.in_(removed)))
+    db.session.commit()
+    catalog.bump_user(user_id)
+    return []
@@ -0,0 +1,71 @@
+from sqlalchemy import select, update, insert, delete
+
+from models import db, Product, Cart, Order, Transaction
+from cache import catalog
+from sales import record_sales
+
+def cart_lines(user_id):
+    return db.session.execute(
+        select(Cart.product_id, Cart.quantity, Product.name, Product.price, Product.category_id)
+        .join(Product, Product.id == Cart.product_id)
+        .where(Cart.user_id == user_id)
+        # always lock products in the same order so concurrent checkouts can't deadlock
+        .order_by(Cart.product_id)
+    ).all()
+
+def claim_cart(user_id, lines):
+    '''
+    delete the cart the lines were read from, so a second submit of the same cart
+    finds it gone. returns an error message if the cart changed in between
+    '''
+    claimed = db.session.execute(delete(Cart).where(Cart.user_id == user_id)).rowcount
+    if claimed != len(lines):
+        db.session.rollback()
+        return 'Your cart changed while placing the order. Please try again.'
+    return None
+
+def checkout(user_id):
+    '''
+    turn the user's cart into a transaction in a single database transaction.
+    stock is decremented with a conditional UPDATE so concurrent buyers can never
+    take it below zero; if any line fails everything is rolled back.
+    returns (transaction, None) on success or (None, error message)
+    '''
+    lines = cart_lines(user_id)
+    if not lines:
+        return None, 'Cart is empty.'
+    try:
+        error = claim_cart(user_id, lines)
+        if error:
+            return None, error
+        for line in lines:
+            decremented = db.session.execute(
+                update(Product)
+                .where(Product.id == line.product_id, Product.quantity >= line.quantity)
+                .values(quantity=Product.quantity - line.quantity)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if decremented != 1:
+                db.session.rollback()
+                available = db.session.scalar(select(Product.quantity).where(Product.id == line.product_id))
+                return None, 'Quantity of ' + line.name + ' must be less than or equal to ' + str(available) + '.'
+        transaction = Transaction(user_id=user_id, total=sum(line.price * line.quantity for line in lines))
+        db.session.add(transaction)
+        db.session.flush()
+        db.session.execute(insert(Order), [{
+            'transaction_id': transaction.id,
+            'product_id': line.product_id,
+            'quantity': line.quantity,
+            'price': line.price,
+        } for line in lines])
+        day = transaction.datetime.date()
+        record_sales((day, line.product_id, line.category_id, line.quantity, line.price) for line in lines)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # stock changed, so cached catalog pages and product grids are stale
+    catalog.bump()
+    catalog.bump_categories(line.category_id for line in lines)
+    catalog.bump_user(user_id)
+    return transaction, None
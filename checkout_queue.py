@@ -0,0 +1,185 @@
+import datetime
+import json
+import threading
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, update, insert
+
+from models import db, Product, Cart, Order, Transaction, CheckoutJob
+from database import upsert
+from cache import catalog
+from checkout import cart_lines, claim_cart
+from sales import record_sales
+
+# with CHECKOUT_QUEUE on, place_order only checks the cart and stores it as a
+# pending CheckoutJob, and the buyer polls for the result. workers take
+# pending jobs in batches of CHECKOUT_BATCH and settle a whole batch in one
+# database transaction: stock is read once, the jobs are accepted or failed
+# in order against it, and each product gets a single decrement for the
+# whole batch. so a flash sale costs one commit per batch instead of one
+# per buyer, all fighting over the same product row.
+
+POLL_SECONDS = 0.2
+
+wakeup = threading.Event()
+workers_lock = threading.Lock()
+
+## enqueueing
+
+def enqueue_checkout(user_id):
+    '''
+    claim the user's cart and queue it. stock is checked here to fail early, but
+    only the worker's check counts. returns (job, None) or (None, error message)
+    '''
+    lines = cart_lines(user_id)
+    if not lines:
+        return None, 'Cart is empty.'
+    stock = dict(db.session.execute(
+        select(Product.id, Product.quantity).where(Product.id.in_([line.product_id for line in lines]))
+    ).all())
+    for line in lines:
+        if line.quantity > stock[line.product_id]:
+            return None, 'Quantity of ' + line.name + ' must be less than or equal to ' + str(stock[line.product_id]) + '.'
+    try:
+        error = claim_cart(user_id, lines)
+        if error:
+            return None, error
+        job = CheckoutJob(user_id=user_id, lines=json.dumps([line._asdict() for line in lines]))
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    catalog.bump_user(user_id)
+    start_workers(current_app._get_current_object())
+    wakeup.set()
+    return job, None
+
+## settling
+
+def process_batch(limit):
+    '''settle up to `limit` pending jobs in one transaction. returns how many were settled'''
+    # claiming is the first statement, so with sqlite the batch holds the write lock from the start.
+    # other workers skip the rows locked here (postgres), the outer status check drops any job
+    # claimed in between, and only the ids returned are this batch's
+    claimed = db.session.scalars(
+        update(CheckoutJob)
+        .where(CheckoutJob.id.in_(
+            select(CheckoutJob.id).where(CheckoutJob.status == 'pending').order_by(CheckoutJob.id).limit(limit)
+            .with_for_update(skip_locked=True)
+        ), CheckoutJob.status == 'pending')
+        .values(status='processing')
+        .returning(CheckoutJob.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not claimed:
+        db.session.rollback()
+        return 0
+    try:
+        jobs = db.session.scalars(
+            select(CheckoutJob).where(CheckoutJob.id.in_(claimed)).order_by(CheckoutJob.id)
+        ).all()
+        job_lines = {job.id: json.loads(job.lines) for job in jobs}
+        product_ids = sorted({line['product_id'] for lines in job_lines.values() for line in lines})
+        stock = dict(db.session.execute(
+            select(Product.id, Product.quantity).where(Product.id.in_(product_ids)).with_for_update()
+        ).all())
+        now = datetime.datetime.utcnow()
+        accepted, decrements, restore = [], {}, []
+        for job in jobs:
+            lines = job_lines[job.id]
+            short = next((line for line in lines if line['quantity'] > stock.get(line['product_id'], 0)), None)
+            job.finished_at = now
+            if short:
+                job.status = 'failed'
+                job.error = 'Quantity of ' + short['name'] + ' must be less than or equal to ' + str(stock.get(short['product_id'], 0)) + '.'
+                # give the buyer their cart back, without products deleted since the job was queued
+                restore += [{'user_id': job.user_id, 'product_id': line['product_id'], 'quantity': line['quantity']}
+                            for line in lines if line['product_id'] in stock]
+                continue
+            for line in lines:
+                stock[line['product_id']] -= line['quantity']
+                decrements[line['product_id']] = decrements.get(line['product_id'], 0) + line['quantity']
+            job.status = 'done'
+            accepted.append(job)
+        for product_id, quantity in sorted(decrements.items()):
+            decremented = db.session.execute(
+                update(Product)
+                .where(Product.id == product_id, Product.quantity >= quantity)
+                .values(quantity=Product.quantity - quantity)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if decremented != 1:
+                # a synchronous checkout got in between, leave the batch pending and try again
+                raise RuntimeError('stock of product %d changed during a checkout batch' % product_id)
+        transactions = [Transaction(user_id=job.user_id, datetime=job.created_at,
+                                    total=sum(line['price'] * line['quantity'] for line in job_lines[job.id]))
+                        for job in accepted]
+        db.session.add_all(transactions)
+        db.session.flush()
+        orders = []
+        for job, transaction in zip(accepted, transactions):
+            job.transaction_id = transaction.id
+            orders += [{'transaction_id': transaction.id, 'product_id': line['product_id'],
+                        'quantity': line['quantity'], 'price': line['price']} for line in job_lines[job.id]]
+        if orders:
+            db.session.execute(insert(Order), orders)
+            record_sales((job.created_at.date(), line['product_id'], line['category_id'], line['quantity'], line['price'])
+                         for job in accepted for line in job_lines[job.id])
+        if restore:
+            statement = upsert(db.session, Cart)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['user_id', 'product_id'], set_={'quantity': Cart.quantity + statement.excluded.quantity}
+            ), restore)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if accepted:
+        catalog.bump()
+        catalog.bump_categories({line['category_id'] for job in accepted for line in job_lines[job.id]})
+    for user_id in {job.user_id for job in jobs}:
+        catalog.bump_user(user_id)
+    return len(jobs)
+
+def work(app, batch):
+    with app.app_context():
+        while True:
+            try:
+                settled = process_batch(batch)
+            except Exception:
+                app.logger.exception('checkout batch failed')
+                settled = 0
+            if not settled:
+                wakeup.wait(POLL_SECONDS)
+                wakeup.clear()
+
+def start_workers(app):
+    '''start the app's CHECKOUT_WORKERS worker threads in this process, once'''
+    if not app.config['CHECKOUT_WORKERS'] or 'checkout_workers' in app.extensions:
+        return
+    with workers_lock:
+        if 'checkout_workers' in app.extensions:
+            return
+        threads = [threading.Thread(target=work, args=(app, app.config['CHECKOUT_BATCH']), name='checkout-%d' % n, daemon=True)
+                   for n in range(app.config['CHECKOUT_WORKERS'])]
+        for thread in threads:
+            thread.start()
+        app.extensions['checkout_workers'] = threads
+
+@click.command('checkout-worker')
+@click.option('--threads', default=1, help='Worker threads.')
+@with_appcontext
+def worker_command(threads):
+    '''Settle queued checkouts until stopped.'''
+    app = current_app._get_current_object()
+    for n in range(threads - 1):
+        threading.Thread(target=work, args=(app, app.config['CHECKOUT_BATCH']), daemon=True).start()
+    click.echo('settling queued checkouts, batches of %d' % app.config['CHECKOUT_BATCH'])
+    work(app, app.config['CHECKOUT_BATCH'])
+
+## results
+
+def job_status(job):
+    return {'id': job.id, 'status': job.status, 'transaction_id': job.transaction_id, 'error': job.error}
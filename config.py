@@ -1,9 +1,75 @@
 from dotenv import load_dotenv
 from os import getenv
-from app import app
 
 load_dotenv()
 
-app.config['SQLALCHEMY_DATABASE_URI'] = getenv('SQLALCHEMY_DATABASE_URI')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = getenv('SQLALCHEMY_TRACK_MODIFICATIONS')
-app.config['SECRET_KEY'] = getenv('SECRET_KEY')
+def flag(name, default=''):
+    return getenv(name, default).lower() in ('1', 'true', 'yes')
+
+def engine_options():
+    # connection pool settings, anything unset keeps sqlalchemy's default
+    options = {'pool_pre_ping': flag('DB_POOL_PRE_PING')}
+    for option, name in [('pool_size', 'DB_POOL_SIZE'), ('max_overflow', 'DB_MAX_OVERFLOW'),
+                         ('pool_timeout', 'DB_POOL_TIMEOUT'), ('pool_recycle', 'DB_POOL_RECYCLE')]:
+        if getenv(name):
+            options[option] = int(getenv(name))
+    return options
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = getenv('SQLALCHEMY_DATABASE_URI')
+    SQLALCHEMY_TRACK_MODIFICATIONS = getenv('SQLALCHEMY_TRACK_MODIFICATIONS')
+    SECRET_KEY = getenv('SECRET_KEY')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options()
+
+    # optional read replica for @read_only pages. to try it locally, point it at a copy
+    # of the sqlite file (sqlite:///file:replica.db?mode=ro&uri=true opens it read only)
+    SQLALCHEMY_BINDS = {'replica': getenv('SQLALCHEMY_REPLICA_URI')} if getenv('SQLALCHEMY_REPLICA_URI') else {}
+
+    # database for archived order history (see archive.py). unset keeps the archive tables in the main database
+    SQLALCHEMY_ARCHIVE_URI = getenv('SQLALCHEMY_ARCHIVE_URI')
+    # `flask archive-orders` moves transactions older than this many days to the archive
+    ARCHIVE_AFTER_DAYS = int(getenv('ARCHIVE_AFTER_DAYS', '365'))
+
+    # sqlite only: write ahead logging with synchronous=NORMAL, and how many ms to wait for a lock
+    SQLITE_WAL = flag('SQLITE_WAL', '1')
+    SQLITE_BUSY_TIMEOUT = int(getenv('SQLITE_BUSY_TIMEOUT', '5000'))
+
+    # fail requests that run more sql statements than their route's @query_budget (for tests and CI)
+    QUERY_BUDGET_ENFORCE = flag('QUERY_BUDGET_ENFORCE')
+    # send the number of sql statements a request ran in an X-Query-Count header (for load tests)
+    QUERY_COUNT_HEADER = flag('QUERY_COUNT_HEADER')
+
+    # log the sql statements of requests slower than this many seconds (0 is off)
+    SLOW_REQUEST_SECONDS = float(getenv('SLOW_REQUEST_SECONDS', '0'))
+    # lets a prometheus scraper read /admin/metrics with "Authorization: Bearer <token>" instead of an admin login
+    METRICS_TOKEN = getenv('METRICS_TOKEN')
+
+    # keep is_admin and the display name in the signed session cookie so auth checks
+    # skip the database. changes to a user (like losing admin) only apply on next login
+    SESSION_USER_CACHE = flag('SESSION_USER_CACHE')
+
+    # gzip html, json, css and js responses of at least COMPRESS_MIN_SIZE bytes (brotli when the package is installed)
+    COMPRESS = flag('COMPRESS', '1')
+    COMPRESS_MIN_SIZE = int(getenv('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_LEVEL = int(getenv('COMPRESS_LEVEL', '6'))
+
+    # catalog read cache: 'local' keeps it in each worker, 'sqlite' shares it between workers through a file.
+    # pages and the api only answer conditional requests (etags) with 'sqlite'
+    CATALOG_CACHE_BACKEND = getenv('CATALOG_CACHE_BACKEND', 'local')
+    CATALOG_CACHE_PATH = getenv('CATALOG_CACHE_PATH', 'catalog_cache.db')
+    CATALOG_CACHE_SIZE = int(getenv('CATALOG_CACHE_SIZE', '1024'))
+    CATALOG_CACHE_TTL = int(getenv('CATALOG_CACHE_TTL', '300'))
+
+    # password hashing, any method werkzeug's generate_password_hash accepts, like 'pbkdf2:sha256:600000' or 'scrypt'.
+    # stored hashes made with other settings are upgraded on the next login.
+    # PASSWORD_HASH_WORKERS > 0 runs hashing in a bounded 'thread' or 'process' pool
+    PASSWORD_HASH_METHOD = getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_SALT_LENGTH = int(getenv('PASSWORD_HASH_SALT_LENGTH', '16'))
+    PASSWORD_HASH_WORKERS = int(getenv('PASSWORD_HASH_WORKERS', '0'))
+    PASSWORD_HASH_POOL = getenv('PASSWORD_HASH_POOL', 'thread')
+
+    # queue checkouts and settle them in batches (see checkout_queue.py). CHECKOUT_WORKERS threads per
+    # process settle the queue, set it to 0 to run `flask checkout-worker` separately instead
+    CHECKOUT_QUEUE = flag('CHECKOUT_QUEUE')
+    CHECKOUT_WORKERS = int(getenv('CHECKOUT_WORKERS', '1'))
+    CHECKOUT_BATCH = int(getenv('CHECKOUT_BATCH', '100'))
@@ -0,0 +1,63 @@
+import sqlite3
+from functools import wraps
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+## read replica
+# with SQLALCHEMY_REPLICA_URI set, views marked @read_only read from the
+# 'replica' bind and everything else (including flushes) uses the primary.
+# replicas lag behind, so only mark pages that can show slightly old data,
+# and note that catalog cache entries filled from the replica keep it until
+# the next catalog write or the cache ttl.
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        # only statements for the primary go to the replica, models on other binds (the archive) stay there
+        if bind is None and engine is self._db.engines.get(None) and not self._flushing \
+                and has_request_context() and g.get('read_only'):
+            return self._db.engines.get('replica', engine)
+        return engine
+
+def read_only(func):
+    @wraps(func)
+    def inner(*args, **kwargs):
+        g.read_only = True
+        return func(*args, **kwargs)
+    return inner
+
+## upserts
+
+def upsert(session, model):
+    '''an insert for the session's database that supports .on_conflict_do_update()'''
+    return (postgresql.insert if session.get_bind(mapper=model).dialect.name == 'postgresql' else sqlite.insert)(model)
+
+## sqlite
+
+def sqlite_pragmas(wal, busy_timeout):
+    def set_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        # wait for other writers instead of failing with "database is locked"
+        cursor.execute('PRAGMA busy_timeout = %d' % busy_timeout)
+        if wal:
+            # readers no longer block the writer (and the other way round). the mode is
+            # stored in the file, so this fails harmlessly on read only connections
+            try:
+                cursor.execute('PRAGMA journal_mode = WAL')
+            except sqlite3.OperationalError:
+                pass
+            # with wal, syncing on checkpoints only is still safe against corruption
+            cursor.execute('PRAGMA synchronous = NORMAL')
+        cursor.close()
+    return set_pragmas
+
+def init_app(app, db):
+    set_pragmas = sqlite_pragmas(app.config['SQLITE_WAL'], app.config['SQLITE_BUSY_TIMEOUT'])
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', set_pragmas)
@@ -0,0 +1,82 @@
+from collections import namedtuple
+from sqlalchemy import select, update, delete, exists, func, or_, literal_column
+
+from models import db, Product, Category, Cart, Order, DailyProductSales, DailyCategorySales
+
+# deleting a product or a whole category is a handful of set based statements
+# in one transaction that never load the rows they touch. cart lines for the
+# products go, products that were ever sold are only flagged is_deleted so
+# order history (live and archived) and the sales reports can still show them,
+# and the rest are deleted. a category is flagged instead of deleted while
+# flagged products or sales rollups still point at it.
+
+ProductDeleteCounts = namedtuple('ProductDeleteCounts', 'cart_lines order_lines sold')
+CategoryDeleteCounts = namedtuple('CategoryDeleteCounts', 'products sold_products cart_lines order_lines')
+
+def product_sold():
+    # the rollups include archived orders, which can't be searched by product. the
+    # literal 0 matches the condition of the partial index ix_daily_product_sales_sold
+    return or_(exists().where(Order.product_id == Product.id),
+               exists().where(DailyProductSales.product_id == Product.id, DailyProductSales.quantity > literal_column('0')))
+
+def category_referenced():
+    return or_(exists().where(Product.category_id == Category.id),
+               exists().where(DailyCategorySales.category_id == Category.id))
+
+def delete_products(*where):
+    '''delete the products matching `where` and their cart lines, flagging the sold ones. returns (deleted, flagged)'''
+    db.session.execute(delete(Cart).where(Cart.product_id.in_(select(Product.id).where(*where)))
+                       .execution_options(synchronize_session=False))
+    flagged = db.session.execute(
+        update(Product).where(*where, Product.is_deleted == False, product_sold()).values(is_deleted=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    deleted = db.session.execute(
+        delete(Product).where(*where, ~product_sold()).execution_options(synchronize_session=False)
+    ).rowcount
+    return deleted, flagged
+
+def delete_product_cascade(id):
+    '''delete or flag one product, in one transaction. returns (deleted, flagged)'''
+    try:
+        counts = delete_products(Product.id == id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return counts
+
+def delete_category_cascade(id):
+    '''delete or flag a category and all its products, in one transaction. returns (deleted, flagged) products'''
+    try:
+        counts = delete_products(Product.category_id == id)
+        db.session.execute(update(Category).where(Category.id == id, category_referenced()).values(is_deleted=True)
+                           .execution_options(synchronize_session=False))
+        db.session.execute(delete(Category).where(Category.id == id, ~category_referenced())
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return counts
+
+## confirmation pages
+
+def product_delete_counts(id):
+    '''what deleting a product touches, counted in one query'''
+    return ProductDeleteCounts(*db.session.execute(select(
+        select(func.count()).where(Cart.product_id == id).scalar_subquery(),
+        select(func.count()).where(Order.product_id == id).scalar_subquery(),
+        exists().where(Product.id == id, product_sold()),
+    )).one())
+
+def category_delete_counts(id):
+    '''what deleting a category touches, counted in one query'''
+    products = select(Product.id).where(Product.category_id == id, Product.is_deleted == False)
+    return CategoryDeleteCounts(*db.session.execute(select(
+        select(func.count()).where(Product.category_id == id, Product.is_deleted == False).scalar_subquery(),
+        select(func.count()).where(Product.category_id == id, Product.is_deleted == False, product_sold())
+            .scalar_subquery(),
+        select(func.count()).where(Cart.product_id.in_(products)).scalar_subquery(),
+        select(func.count()).where(Order.product_id.in_(products)).scalar_subquery(),
+    )).one())
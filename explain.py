@@ -0,0 +1,100 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import and_, event, select, update, literal_column
+
+from models import db, User, Product, Category, Cart, Order, DailyProductSales
+from cache import CatalogCache, LocalCache
+
+# GET routes to replay, {category} is filled in with a real category id
+ROUTES = [
+    ('customer', '/'),
+    ('customer', '/?parameter=product&query=apple'),
+    ('customer', '/?parameter=product&query=ap'),
+    ('customer', '/?parameter=category&query=fruit'),
+    ('customer', '/?parameter=price&query=100'),
+    ('customer', '/cart'),
+    ('customer', '/orders'),
+    ('customer', '/orders?format=ndjson'),
+    ('customer', '/api/v1/products?ids=1,2,3'),
+    ('customer', '/api/v1/orders'),
+    ('admin', '/admin'),
+    ('admin', '/admin/sales'),
+    ('admin', '/admin/reorder'),
+    ('admin', '/category/{category}/show'),
+    ('admin', '/product/add'),
+]
+
+def write_queries():
+    # the lookups done by POST routes, which we don't want to replay for real
+    return [
+        ('add_to_cart / update_cart_lines: stock and cart', select(Product.id, Product.quantity, Cart.quantity)
+            .outerjoin(Cart, and_(Cart.product_id == Product.id, Cart.user_id == 1)).where(Product.id.in_([1, 2, 3]))),
+        ('delete_from_cart', Cart.query.filter_by(user_id=1).filter_by(product_id=1).statement),
+        ('place_order: decrement stock', update(Product).where(Product.id == 1, Product.quantity >= 1)
+            .values(quantity=Product.quantity - 1)),
+        ('delete_product: dangling cart lines', select(Cart.id).where(Cart.product_id == 1)),
+        ('delete_product: order history', select(Order.id).where(Order.product_id == 1)),
+        ('delete_product: sales rollups', select(DailyProductSales.day)
+            .where(DailyProductSales.product_id == 1, DailyProductSales.quantity > literal_column('0'))),
+        ('delete_category: products', select(Product.id).where(Product.category_id == 1)),
+    ]
+
+def explain(conn, statement, parameters):
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = conn.exec_driver_sql(prefix + statement, parameters).all()
+    if conn.dialect.name == 'sqlite':
+        return [row[-1] for row in rows]
+    return [str(row[0]) for row in rows]
+
+def capture(path, user_id):
+    statements = {}
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.setdefault(statement, parameters)
+    client = current_app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(path)
+        response.get_data()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return statements
+
+def print_plan(title, statements):
+    click.secho(title, bold=True)
+    with db.engine.connect() as conn:
+        for statement, parameters in statements.items():
+            click.echo('  ' + ' '.join(statement.split()))
+            for line in explain(conn, statement, parameters):
+                click.echo('      ' + line)
+    click.echo()
+
+@click.command('explain-queries')
+@with_appcontext
+def explain_queries_command():
+    '''Print the query plan of every query the main routes run.'''
+    customer = User.query.filter_by(is_admin=False).first()
+    admin = User.query.filter_by(is_admin=True).first()
+    category = Category.query.first()
+    users = {'customer': customer.id if customer else None, 'admin': admin.id if admin else None}
+    # a cache that never keeps anything, so every route really queries
+    cache = current_app.extensions['catalog_cache']
+    current_app.extensions['catalog_cache'] = CatalogCache(LocalCache(max_entries=0))
+    try:
+        for role, path in ROUTES:
+            if users[role] is None or ('{category}' in path and category is None):
+                click.echo('skipping %s, no %s in the database\n' % (path, 'category' if users[role] else role))
+                continue
+            path = path.format(category=category.id if category else 0)
+            print_plan('%s (%s)' % (path, role), capture(path, users[role]))
+    finally:
+        current_app.extensions['catalog_cache'] = cache
+    with db.engine.connect() as conn:
+        for title, query in write_queries():
+            # expand IN lists into one placeholder per value, like execution does
+            compiled = query.compile(conn, compile_kwargs={'render_postcompile': True})
+            parameters = tuple(compiled.params[name] for name in compiled.positiontup) \
+                if compiled.positional else compiled.params
+            print_plan(title, {str(compiled): parameters})
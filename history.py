@@ -0,0 +1,178 @@
+import datetime
+import json
+from collections import namedtuple
+from itertools import chain, groupby
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import selectinload
+
+from models import db, Product, Order, Transaction, ArchivedTransaction
+
+TRANSACTIONS_PER_PAGE = 20
+STREAM_BATCH = 200
+
+## cursors
+# order history is paged newest first on (datetime, id), which the
+# (user_id, datetime, id) index on transaction serves directly
+
+def make_cursor(transaction):
+    return '%s_%d' % (transaction.datetime.isoformat(), transaction.id)
+
+def parse_cursor(after):
+    if not after or '_' not in after:
+        return None
+    when, _, id = after.rpartition('_')
+    if not id.isdigit():
+        return None
+    try:
+        return datetime.datetime.fromisoformat(when), int(id)
+    except ValueError:
+        return None
+
+def user_transactions(user_id, after=None):
+    # history keeps showing deleted products
+    query = Transaction.query.filter_by(user_id=user_id) \
+        .order_by(Transaction.datetime.desc(), Transaction.id.desc()) \
+        .execution_options(include_deleted=True)
+    cursor = parse_cursor(after)
+    if cursor:
+        query = query.filter(tuple_(Transaction.datetime, Transaction.id) < cursor)
+    return query
+
+## archive
+# transactions moved out by archive.py are older than every live one, so a
+# user's history is the live transactions followed by the archived ones, and
+# the archive is only read once a page runs past the live history.
+
+# stand ins for Transaction and Order (with .product) when rendering archived history
+ArchivedTransactionRow = namedtuple('ArchivedTransactionRow', 'id datetime total orders')
+ArchivedOrderRow = namedtuple('ArchivedOrderRow', 'product product_id quantity price')
+
+def archived_transactions(user_id, after=None, limit=None):
+    query = select(ArchivedTransaction) \
+        .where(ArchivedTransaction.user_id == user_id) \
+        .order_by(ArchivedTransaction.datetime.desc(), ArchivedTransaction.id.desc()) \
+        .limit(limit)
+    cursor = parse_cursor(after)
+    if cursor:
+        query = query.where(tuple_(ArchivedTransaction.datetime, ArchivedTransaction.id) < cursor)
+    return query
+
+def archived_rows(archived):
+    '''ArchivedTransactions -> ArchivedTransactionRows, with the products of all of them loaded in one query'''
+    lines = {transaction.id: json.loads(transaction.lines) for transaction in archived}
+    product_ids = {product_id for transaction_lines in lines.values() for product_id, quantity, price in transaction_lines}
+    products = {product.id: product for product in Product.query.filter(Product.id.in_(product_ids)).execution_options(include_deleted=True)} if product_ids else {}
+    return [ArchivedTransactionRow(transaction.id, transaction.datetime, transaction.total, [
+        ArchivedOrderRow(products.get(product_id), product_id, quantity, price)
+        for product_id, quantity, price in lines[transaction.id]
+    ]) for transaction in archived]
+
+def archived_page(user_id, after, limit):
+    return archived_rows(db.session.scalars(archived_transactions(user_id, after, limit)).all())
+
+def iter_archived(user_id):
+    archived = db.session.scalars(archived_transactions(user_id).execution_options(yield_per=STREAM_BATCH))
+    for batch in archived.partitions():
+        yield from archived_rows(batch)
+
+## queries
+
+def transactions_page(user_id, after=None, per_page=TRANSACTIONS_PER_PAGE):
+    '''
+    one page of a user's transactions with their orders and products loaded.
+    returns ([transaction, ...], next_cursor)
+    '''
+    transactions = user_transactions(user_id, after) \
+        .options(selectinload(Transaction.orders).joinedload(Order.product)) \
+        .limit(per_page + 1) \
+        .all()
+    if len(transactions) <= per_page:
+        # the live history ran out, carry on into the archive
+        transactions += archived_page(user_id, make_cursor(transactions[-1]) if transactions else after,
+                                      per_page + 1 - len(transactions))
+    next_cursor = None
+    if len(transactions) > per_page:
+        transactions = transactions[:per_page]
+        next_cursor = make_cursor(transactions[-1])
+    return transactions, next_cursor
+
+def iter_transactions(user_id):
+    '''the whole history, fetched STREAM_BATCH transactions at a time'''
+    live = user_transactions(user_id) \
+        .options(selectinload(Transaction.orders).joinedload(Order.product)) \
+        .yield_per(STREAM_BATCH)
+    return chain(live, iter_archived(user_id))
+
+def transaction_dicts_page(user_id, after=None, per_page=TRANSACTIONS_PER_PAGE):
+    '''
+    like transactions_page but as plain dicts built from row tuples, for the api.
+    returns ([transaction, ...], next_cursor)
+    '''
+    query = select(Transaction.id, Transaction.datetime, Transaction.total) \
+        .where(Transaction.user_id == user_id) \
+        .order_by(Transaction.datetime.desc(), Transaction.id.desc()) \
+        .limit(per_page + 1)
+    cursor = parse_cursor(after)
+    if cursor:
+        query = query.where(tuple_(Transaction.datetime, Transaction.id) < cursor)
+    transactions = db.session.execute(query).all()
+    if len(transactions) <= per_page:
+        # the live history ran out, carry on into the archive
+        transactions += archived_page(user_id, make_cursor(transactions[-1]) if transactions else after,
+                                      per_page + 1 - len(transactions))
+    next_cursor = None
+    if len(transactions) > per_page:
+        transactions = transactions[:per_page]
+        next_cursor = make_cursor(transactions[-1])
+    lines = {transaction.id: [] for transaction in transactions if not isinstance(transaction, ArchivedTransactionRow)}
+    if lines:
+        rows = db.session.execute(
+            select(Order.transaction_id, Order.product_id, Product.name, Order.quantity, Order.price)
+            .join(Product, Product.id == Order.product_id)
+            .where(Order.transaction_id.in_(list(lines)))
+            .order_by(Order.id)
+            .execution_options(include_deleted=True)
+        )
+        for row in rows:
+            lines[row.transaction_id].append({
+                'product_id': row.product_id, 'product': row.name, 'quantity': row.quantity, 'price': row.price,
+            })
+    for transaction in transactions:
+        if isinstance(transaction, ArchivedTransactionRow):
+            lines[transaction.id] = [{
+                'product_id': order.product_id, 'product': order.product.name if order.product else None,
+                'quantity': order.quantity, 'price': order.price,
+            } for order in transaction.orders]
+    return [{
+        'id': transaction.id,
+        'datetime': transaction.datetime.isoformat(),
+        'total': transaction.total,
+        'orders': lines[transaction.id],
+    } for transaction in transactions], next_cursor
+
+def iter_transaction_dicts(user_id):
+    '''the whole history as plain dicts built from row tuples, for NDJSON'''
+    rows = db.session.execute(
+        select(Transaction.id, Transaction.datetime, Transaction.total,
+               Product.name, Order.quantity, Order.price)
+        .join(Order, Order.transaction_id == Transaction.id)
+        .join(Product, Product.id == Order.product_id)
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.datetime.desc(), Transaction.id.desc(), Order.id)
+        .execution_options(yield_per=STREAM_BATCH, include_deleted=True)
+    )
+    for (id, when, total), lines in groupby(rows, key=lambda row: (row.id, row.datetime, row.total)):
+        yield {
+            'id': id,
+            'datetime': when.isoformat(),
+            'total': total,
+            'orders': [{'product': line.name, 'quantity': line.quantity, 'price': line.price} for line in lines],
+        }
+    for transaction in iter_archived(user_id):
+        yield {
+            'id': transaction.id,
+            'datetime': transaction.datetime.isoformat(),
+            'total': transaction.total,
+            'orders': [{'product': order.product.name if order.product else None, 'quantity': order.quantity, 'price': order.price}
+                       for order in transaction.orders],
+        }
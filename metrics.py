@@ -0,0 +1,139 @@
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from database import RoutingSession
+from querycount import request_queries
+
+# per endpoint request latency, sql, template and password hashing time,
+# kept in memory by each worker process and served in the prometheus text
+# format at /admin/metrics. streamed responses are timed until the view
+# returns, not until the last byte is sent.
+
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# name -> help text of the per endpoint totals
+TOTALS = {
+    'sql_statements': 'SQL statements executed.',
+    'sql_seconds': 'Time spent in SQL statements.',
+    'orm_relationship_loads': 'Relationship loads (lazy and eager) issued by the ORM.',
+    'template_seconds': 'Time spent rendering templates.',
+    'password_hash_seconds': 'Time spent hashing and checking passwords.',
+    'slow_requests': 'Requests slower than SLOW_REQUEST_SECONDS.',
+}
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.durations = {}
+        self.totals = {}
+
+    def observe(self, endpoint, method, status, seconds, totals):
+        with self.lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            # cumulative bucket counts, then the sum and count of all observations
+            histogram = self.durations.setdefault((endpoint, method), [0] * (len(BUCKETS) + 2))
+            for n, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[n] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            for name, value in totals.items():
+                self.totals[name, endpoint] = self.totals.get((name, endpoint), 0) + value
+
+    def exposition(self):
+        '''the metrics in the prometheus text format'''
+        with self.lock:
+            lines = ['# HELP groceri_requests_total Requests handled.', '# TYPE groceri_requests_total counter']
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append('groceri_requests_total{endpoint="%s",method="%s",status="%d"} %d' % (endpoint, method, status, count))
+            lines += ['# HELP groceri_request_duration_seconds Request latency.', '# TYPE groceri_request_duration_seconds histogram']
+            for (endpoint, method), histogram in sorted(self.durations.items()):
+                labels = 'endpoint="%s",method="%s"' % (endpoint, method)
+                for bound, count in zip(BUCKETS, histogram):
+                    lines.append('groceri_request_duration_seconds_bucket{%s,le="%s"} %d' % (labels, bound, count))
+                lines.append('groceri_request_duration_seconds_bucket{%s,le="+Inf"} %d' % (labels, histogram[-1]))
+                lines.append('groceri_request_duration_seconds_sum{%s} %f' % (labels, histogram[-2]))
+                lines.append('groceri_request_duration_seconds_count{%s} %d' % (labels, histogram[-1]))
+            for name, help in TOTALS.items():
+                lines += ['# HELP groceri_%s_total %s' % (name, help), '# TYPE groceri_%s_total counter' % name]
+                for (total, endpoint), value in sorted(self.totals.items()):
+                    if total == name:
+                        lines.append('groceri_%s_total{endpoint="%s"} %s' % (name, endpoint, '%g' % value))
+        return '\n'.join(lines) + '\n'
+
+## collecting
+
+@contextmanager
+def timed(name):
+    '''add the time spent in the block to the current request's `name` total'''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            timings = g.setdefault('timings', {})
+            timings[name] = timings.get(name, 0) + time.perf_counter() - start
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def end_statement(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['statement_start'].pop()
+    if has_request_context():
+        timings = g.setdefault('timings', {})
+        timings['sql_seconds'] = timings.get('sql_seconds', 0) + seconds
+        g.setdefault('statement_seconds', []).append((statement, seconds))
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def count_relationship_load(orm_execute_state):
+    if orm_execute_state.is_relationship_load and has_request_context():
+        timings = g.setdefault('timings', {})
+        timings['orm_relationship_loads'] = timings.get('orm_relationship_loads', 0) + 1
+
+def start_template(sender, template, context, **extra):
+    g.setdefault('template_start', []).append(time.perf_counter())
+
+def end_template(sender, template, context, **extra):
+    if g.get('template_start'):
+        timings = g.setdefault('timings', {})
+        timings['template_seconds'] = timings.get('template_seconds', 0) + time.perf_counter() - g.template_start.pop()
+
+def start_request():
+    g.request_start = time.perf_counter()
+
+def record_request(response):
+    if 'request_start' not in g:
+        return response
+    seconds = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or 'none'
+    totals = dict(g.get('timings', {}))
+    totals['sql_statements'] = len(request_queries())
+    threshold = current_app.config['SLOW_REQUEST_SECONDS']
+    if threshold and seconds > threshold:
+        totals['slow_requests'] = 1
+        log_slow_request(endpoint, seconds, totals)
+    current_app.extensions['metrics'].observe(endpoint, request.method, response.status_code, seconds, totals)
+    return response
+
+def log_slow_request(endpoint, seconds, totals):
+    lines = ['slow request: %s %s (%s) took %.3fs, %d sql statements in %.3fs, templates %.3fs' % (
+        request.method, request.full_path.rstrip('?'), endpoint, seconds, totals['sql_statements'],
+        totals.get('sql_seconds', 0), totals.get('template_seconds', 0))]
+    for statement, statement_seconds in g.get('statement_seconds', []):
+        lines.append('    %.4fs  %s' % (statement_seconds, ' '.join(statement.split())))
+    current_app.logger.warning('\n'.join(lines))
+
+def init_app(app):
+    app.extensions['metrics'] = Metrics()
+    app.before_request(start_request)
+    app.after_request(record_request)
+    before_render_template.connect(start_template, app)
+    template_rendered.connect(end_template, app)
@@ -0,0 +1,114 @@
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text, inspect
+
+from models import db, create_search_index, create_admin
+
+# db.create_all() only creates missing tables, it never changes existing ones.
+# schema changes to existing databases go here, in order, and each one runs
+# once per database; applied ids are recorded in the schema_migrations table.
+# fresh databases already get everything from create_all, so every statement
+# must be safe to run against a schema that already has it. a statement can
+# also be a function, for changes sql has no IF NOT EXISTS for.
+
+def add_column(table, column, definition):
+    '''a migration step adding a column to a table that doesn't have it yet'''
+    def step():
+        if column not in {existing['name'] for existing in inspect(db.session.connection()).get_columns(table)}:
+            db.session.execute(text('ALTER TABLE %s ADD COLUMN %s %s' % (table, column, definition)))
+    return step
+
+MIGRATIONS = [
+    ('0001_product_indexes', [
+        'CREATE INDEX IF NOT EXISTS ix_product_category_id ON product (category_id)',
+        'CREATE INDEX IF NOT EXISTS ix_product_price ON product (price)',
+    ]),
+    ('0002_transaction_history_index', [
+        'CREATE INDEX IF NOT EXISTS ix_transaction_user_datetime ON "transaction" (user_id, datetime, id)',
+    ]),
+    ('0003_cart_unique_user_product', [
+        # fold duplicate cart lines into the oldest one before making them unique
+        '''UPDATE cart SET quantity = (
+            SELECT SUM(duplicate.quantity) FROM cart AS duplicate
+            WHERE duplicate.user_id = cart.user_id AND duplicate.product_id = cart.product_id
+        ) WHERE id IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id HAVING COUNT(*) > 1)''',
+        'DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_cart_user_product ON cart (user_id, product_id)',
+        'CREATE INDEX IF NOT EXISTS ix_cart_product_id ON cart (product_id)',
+    ]),
+    ('0004_order_indexes', [
+        'CREATE INDEX IF NOT EXISTS ix_order_transaction_id ON "order" (transaction_id)',
+        'CREATE INDEX IF NOT EXISTS ix_order_product_id ON "order" (product_id)',
+    ]),
+    ('0005_daily_product_sales_reorder_index', [
+        'CREATE INDEX IF NOT EXISTS ix_daily_product_sales_product_day ON daily_product_sales (product_id, day, quantity)',
+    ]),
+    ('0006_soft_delete', [
+        add_column('product', 'is_deleted', 'BOOLEAN NOT NULL DEFAULT false'),
+        add_column('category', 'is_deleted', 'BOOLEAN NOT NULL DEFAULT false'),
+    ]),
+    ('0007_checkout_job_transaction_index', [
+        # archiving unlinks the jobs of the transactions it moves
+        'CREATE INDEX IF NOT EXISTS ix_checkout_job_transaction_id ON checkout_job (transaction_id)',
+    ]),
+    ('0008_daily_product_sales_day_index', [
+        # led by product_id, sqlite picked 0005's index for day range queries and scanned all of history
+        'DROP INDEX IF EXISTS ix_daily_product_sales_product_day',
+        'CREATE INDEX IF NOT EXISTS ix_daily_product_sales_day_product ON daily_product_sales (day, product_id, quantity, revenue)',
+        'CREATE INDEX IF NOT EXISTS ix_daily_product_sales_sold ON daily_product_sales (product_id) WHERE quantity > 0',
+    ]),
+]
+
+def applied_migrations():
+    db.session.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations (id VARCHAR(128) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)'
+    ))
+    return {row[0] for row in db.session.execute(text('SELECT id FROM schema_migrations'))}
+
+def upgrade():
+    '''apply every migration that hasn't run yet, each in its own transaction. returns the ids applied'''
+    done = applied_migrations()
+    db.session.commit()
+    applied = []
+    for id, statements in MIGRATIONS:
+        if id in done:
+            continue
+        try:
+            for statement in statements:
+                if callable(statement):
+                    statement()
+                else:
+                    db.session.execute(text(statement))
+            db.session.execute(text('INSERT INTO schema_migrations (id, applied_at) VALUES (:id, :now)'),
+                               {'id': id, 'now': datetime.utcnow()})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        applied.append(id)
+    return applied
+
+def init_db():
+    '''create missing tables, bring existing ones up to date and make sure the admin user exists'''
+    db.create_all()
+    create_search_index()
+    upgrade()
+    create_admin()
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    '''Create or upgrade the database and the admin user.'''
+    init_db()
+    click.echo('database is ready')
+
+@click.command('db-upgrade')
+@with_appcontext
+def upgrade_command():
+    '''Apply pending schema migrations.'''
+    applied = upgrade()
+    for id in applied:
+        click.echo('applied ' + id)
+    if not applied:
+        click.echo('database is up to date')
@@ -1,8 +1,31 @@
 from flask_sqlalchemy import SQLAlchemy
-from app import app
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-db = SQLAlchemy(app)
+from passwords import hash_password, verify_password
+from sqlalchemy import text, event, false
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import with_loader_criteria
+from database import RoutingSession
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+## soft deletes
+# products that past orders or the sales rollups still point at, and categories
+# that such products or rollups point at, are flagged rather than deleted (see
+# deletes.py). every orm select leaves flagged rows out, including relationship
+# loads and joins, unless it asks for them with
+# .execution_options(include_deleted=True) like order history and sales reports do.
+
+class SoftDelete:
+    is_deleted = db.Column(db.Boolean, nullable = False, default = False, server_default = false())
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def hide_deleted(orm_execute_state):
+    # relationship and column loads inherit the criteria of the query that loaded their parent
+    if orm_execute_state.is_select and not orm_execute_state.is_column_load \
+            and not orm_execute_state.is_relationship_load \
+            and not orm_execute_state.execution_options.get('include_deleted', False):
+        orm_execute_state.statement = orm_execute_state.statement.options(with_loader_criteria(
+            SoftDelete, lambda cls: cls.is_deleted == False, include_aliases=True
+        ))
 
 ## models
 
@@ -20,25 +43,25 @@ class User(db.Model):
     
     @password.setter
     def password(self, password):
-        self.passhash = generate_password_hash(password)
+        self.passhash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.passhash, password)
+        return verify_password(self.passhash, password)
 
-class Product(db.Model):
+class Product(SoftDelete, db.Model):
     __tablename__ = 'product'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable = False)
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable = False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable = False, index = True)
     quantity = db.Column(db.Integer, nullable = False)
-    price = db.Column(db.Float, nullable = False)
+    price = db.Column(db.Float, nullable = False, index = True)
     man_date = db.Column(db.Date, nullable = False)
     
     ## relationships
     carts = db.relationship('Cart', backref='product', lazy=True)
     orders = db.relationship('Order', backref='product', lazy=True)
 
-class Category(db.Model):
+class Category(SoftDelete, db.Model):
     __tablename__ = 'category'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable = False)
@@ -47,12 +70,16 @@ class Category(db.Model):
     products = db.relationship('Product', backref='category', lazy=True)
 
 class Cart(db.Model):
+    # a user has at most one cart line per product
+    __table_args__ = (db.Index('ix_cart_user_product', 'user_id', 'product_id', unique=True),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable = False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable = False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable = False, index = True)
     quantity = db.Column(db.Integer, nullable = False)
 
 class Transaction(db.Model):
+    # order history is read newest first per user, paged on (datetime, id)
+    __table_args__ = (db.Index('ix_transaction_user_datetime', 'user_id', 'datetime', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     datetime = db.Column(db.DateTime, nullable = False, default = datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable = False)
@@ -64,18 +91,127 @@ class Transaction(db.Model):
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable = False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable = False)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable = False, index = True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable = False, index = True)
     quantity = db.Column(db.Integer, nullable = False)
     price = db.Column(db.Float, nullable = False)
 
+class ArchivedTransaction(db.Model):
+    # a transaction moved out of the live tables by archive.py, with its orders folded
+    # into lines, a json list of [product_id, quantity, price]. lives on the 'archive' bind
+    __bind_key__ = 'archive'
+    __tablename__ = 'archived_transaction'
+    __table_args__ = (db.Index('ix_archived_transaction_user_datetime', 'user_id', 'datetime', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    datetime = db.Column(db.DateTime, nullable = False)
+    user_id = db.Column(db.Integer, nullable = False)
+    total = db.Column(db.Float, nullable = False)
+    lines = db.Column(db.Text, nullable = False)
+
+class CheckoutJob(db.Model):
+    # a cart waiting for the checkout queue (see checkout_queue.py). lines is a json
+    # list of the cart lines, status goes pending -> done or failed
+    __tablename__ = 'checkout_job'
+    __table_args__ = (db.Index('ix_checkout_job_status', 'status', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable = False)
+    status = db.Column(db.String(16), nullable = False, default = 'pending')
+    lines = db.Column(db.Text, nullable = False)
+    created_at = db.Column(db.DateTime, nullable = False, default = datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable = True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable = True, index = True)
+    error = db.Column(db.String(256), nullable = True)
+
+## sales rollups
+# one row per day and product (or category), updated by checkout in the same
+# transaction as the order, so sales reports never have to scan order history.
+# the category is the product's category at the time of the sale.
+
+class DailyProductSales(db.Model):
+    __tablename__ = 'daily_product_sales'
+    __table_args__ = (
+        # the reorder report and the dashboard's top products sum a range of recent days
+        # straight out of this index, without touching the table
+        db.Index('ix_daily_product_sales_day_product', 'day', 'product_id', 'quantity', 'revenue'),
+        # whether a product ever sold, for deletes. partial so only queries repeating the
+        # condition can use it, an index led by product_id tempts sqlite into reading every
+        # day of history for the range queries above to skip sorting their GROUP BY
+        db.Index('ix_daily_product_sales_sold', 'product_id',
+                 sqlite_where=text('quantity > 0'), postgresql_where=text('quantity > 0')),
+    )
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable = False)
+    revenue = db.Column(db.Float, nullable = False)
+    orders = db.Column(db.Integer, nullable = False)
+
+class DailyCategorySales(db.Model):
+    __tablename__ = 'daily_category_sales'
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable = False)
+    revenue = db.Column(db.Float, nullable = False)
+    orders = db.Column(db.Integer, nullable = False)
+
+
+## search index
+
+# full text index over product and category names, kept in sync by triggers.
+# the trigram tokenizer lets MATCH do the same substring search as LIKE '%q%'
+SEARCH_INDEX_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_search(rowid, name, category)
+        VALUES (new.id, new.name, (SELECT name FROM category WHERE id = new.category_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_search_au AFTER UPDATE OF name, category_id ON product BEGIN
+        UPDATE product_search SET name = new.name,
+            category = (SELECT name FROM category WHERE id = new.category_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product BEGIN
+        DELETE FROM product_search WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_search_cu AFTER UPDATE OF name ON category BEGIN
+        UPDATE product_search SET category = new.name
+        WHERE rowid IN (SELECT id FROM product WHERE category_id = new.id);
+    END""",
+]
+
+def search_index_available():
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    return db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_search'"
+    )).first() is not None
+
+def create_search_index():
+    # only sqlite builds with fts5 get the index, everything else falls back to LIKE
+    if db.engine.dialect.name != 'sqlite' or search_index_available():
+        return
+    try:
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE product_search USING fts5(name, category, tokenize='trigram')"
+        ))
+    except OperationalError:
+        db.session.rollback()
+        return
+    for trigger in SEARCH_INDEX_TRIGGERS:
+        db.session.execute(text(trigger))
+    db.session.execute(text(
+        """INSERT INTO product_search(rowid, name, category)
+        SELECT product.id, product.name, category.name
+        FROM product JOIN category ON category.id = product.category_id"""
+    ))
+    db.session.commit()
 
-# create database if it doesn't exist
-with app.app_context():
-    db.create_all()
+def create_admin():
     # create admin if admin does not exist
     admin = User.query.filter_by(username='admin').first()
     if not admin:
         admin = User(username='admin', password='admin', name='admin', is_admin=True)
         db.session.add(admin)
-        db.session.commit()
\ No newline at end of file
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # someone else created it at the same time
+            db.session.rollback()
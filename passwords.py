@@ -0,0 +1,47 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from metrics import timed
+
+# password hashing is deliberately slow. with PASSWORD_HASH_WORKERS set, the
+# work runs in a pool of that many threads (hashlib releases the GIL) or
+# processes, so a burst of logins can only keep that many cores busy and
+# the request threads just wait on the result.
+
+executor = None
+executor_lock = threading.Lock()
+method_prefixes = {}
+
+def run(func, *args):
+    with timed('password_hash_seconds'):
+        return pooled(func, *args)
+
+def pooled(func, *args):
+    global executor
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        return func(*args)
+    if executor is None:
+        with executor_lock:
+            if executor is None:
+                pool = ProcessPoolExecutor if current_app.config['PASSWORD_HASH_POOL'] == 'process' else ThreadPoolExecutor
+                executor = pool(max_workers=workers)
+    return executor.submit(func, *args).result()
+
+def hash_password(password):
+    return run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'], current_app.config['PASSWORD_HASH_SALT_LENGTH'])
+
+def verify_password(passhash, password):
+    return run(check_password_hash, passhash, password)
+
+def needs_rehash(passhash):
+    '''whether a stored hash was made with different settings than the configured ones'''
+    configured = current_app.config['PASSWORD_HASH_METHOD']
+    if configured not in method_prefixes:
+        # werkzeug fills in defaults (like the iteration count), so hash once to see the full method
+        method_prefixes[configured] = generate_password_hash('', configured).split('$', 1)[0]
+    method, _, rest = passhash.partition('$')
+    salt = rest.partition('$')[0]
+    return method != method_prefixes[configured] or len(salt) != current_app.config['PASSWORD_HASH_SALT_LENGTH']
@@ -0,0 +1,152 @@
+import csv
+import datetime
+import io
+import json
+import re
+import time
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+
+from models import db, Product, Category
+from cache import catalog
+
+IMPORT_BATCH = 1000
+
+## validation
+
+def validate_product(name, quantity, price, category, man_date, find_category):
+    '''
+    the rules for a product's fields, shared by the add/edit forms and imports.
+    find_category turns the submitted category into a category id, or None if it doesn't exist.
+    returns (dict of product columns, None) or (None, error message)
+    '''
+    if not name or name == '':
+        return None, 'Product name cannot be empty.'
+    if len(name) > 64:
+        return None, 'Product name cannot be greater than 64 characters.'
+    if not quantity or quantity == '':
+        return None, 'Quantity cannot be empty.'
+    if quantity.isdigit() == False:
+        return None, 'Quantity must be a number.'
+    if not price or price == '':
+        return None, 'Price cannot be empty.'
+    if not re.match(r'^\d+(\.\d+)?$', price):
+        return None, 'Price must be a number.'
+    if not category or category == '':
+        return None, 'Category cannot be empty.'
+    category_id = find_category(category)
+    if not category_id:
+        return None, 'Category does not exist.'
+    if not man_date or man_date == '':
+        return None, 'Manufacture date cannot be empty.'
+    try:
+        man_date = datetime.datetime.strptime(man_date, '%Y-%m-%d').date()
+    except ValueError:
+        return None, 'Invalid manufacture date.'
+    return {
+        'name': name,
+        'quantity': int(quantity),
+        'price': float(price),
+        'category_id': category_id,
+        'man_date': man_date,
+    }, None
+
+def category_by_id(value):
+    category = Category.query.get(value)
+    return category.id if category else None
+
+## bulk import
+
+def read_rows(stream, format):
+    '''yield each row of a csv or ndjson byte stream as a dict of strings, None for blank lines'''
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if format == 'csv':
+        for row in csv.DictReader(text):
+            yield row
+        return
+    for line in text:
+        line = line.strip()
+        if not line:
+            yield None
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            yield {'_error': 'Invalid JSON.'}
+            continue
+        yield {key: '' if value is None else str(value) for key, value in row.items()}
+
+def import_products(stream, format):
+    '''
+    insert products from a csv or ndjson stream with the columns name, quantity,
+    price, category (its name) and manufacture_date. rows are validated as they
+    are read and inserted IMPORT_BATCH at a time, bad rows are skipped and reported.
+    returns {'inserted', 'errors': [(row number, message)], 'seconds', 'rows_per_second'}
+    '''
+    start = time.perf_counter()
+    categories = dict(db.session.query(Category.name, Category.id))
+    touched = set()
+    errors = []
+    inserted = 0
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        db.session.execute(insert(Product), batch)
+        db.session.commit()
+        inserted += len(batch)
+        batch.clear()
+
+    for number, row in enumerate(read_rows(stream, format), start=1):
+        if row is None:
+            continue
+        if '_error' in row:
+            errors.append((number, row['_error']))
+            continue
+        product, error = validate_product(
+            (row.get('name') or '').strip(),
+            (row.get('quantity') or '').strip(),
+            (row.get('price') or '').strip(),
+            (row.get('category') or '').strip(),
+            (row.get('manufacture_date') or '').strip(),
+            categories.get,
+        )
+        if error:
+            errors.append((number, error))
+            continue
+        batch.append(product)
+        touched.add(product['category_id'])
+        if len(batch) >= IMPORT_BATCH:
+            flush()
+    if batch:
+        flush()
+    if inserted:
+        catalog.bump()
+        catalog.bump_categories(touched)
+    seconds = time.perf_counter() - start
+    return {
+        'inserted': inserted,
+        'errors': errors,
+        'seconds': seconds,
+        'rows_per_second': (inserted + len(errors)) / seconds if seconds else 0,
+    }
+
+def import_format(filename, format=None):
+    if format:
+        return format
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+@click.command('import-products')
+@click.argument('file', type=click.File('rb'))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@with_appcontext
+def import_products_command(file, format):
+    '''Import products from a CSV or NDJSON file.'''
+    report = import_products(file, import_format(file.name, format))
+    for number, error in report['errors']:
+        click.echo('row %d: %s' % (number, error), err=True)
+    click.echo('imported %d products, %d rows rejected, in %.2fs (%.0f rows/s)' % (
+        report['inserted'], len(report['errors']), report['seconds'], report['rows_per_second']))
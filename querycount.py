@@ -0,0 +1,42 @@
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# every statement sent to the database during a request is counted on flask.g.
+# routes declare how many they are allowed with @query_budget, and when
+# QUERY_BUDGET_ENFORCE is set (tests, CI) going over the budget is an error.
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    g.setdefault('queries', []).append(statement)
+
+def query_budget(limit):
+    def decorator(func):
+        func.query_budget = limit
+        return func
+    return decorator
+
+def request_queries():
+    return g.get('queries', [])
+
+def check_query_budget(response):
+    if current_app.config.get('QUERY_COUNT_HEADER'):
+        response.headers['X-Query-Count'] = str(len(request_queries()))
+    if not current_app.config.get('QUERY_BUDGET_ENFORCE'):
+        return response
+    view = current_app.view_functions.get(request.endpoint)
+    limit = getattr(view, 'query_budget', None)
+    queries = request_queries()
+    if limit is not None and len(queries) > limit:
+        raise QueryBudgetExceeded(
+            '%s ran %d queries, budget is %d:\n%s' % (request.endpoint, len(queries), limit, '\n'.join(queries))
+        )
+    return response
+
+def init_app(app):
+    app.after_request(check_query_budget)
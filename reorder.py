@@ -0,0 +1,121 @@
+import datetime
+from collections import namedtuple
+from sqlalchemy import select, func
+
+from models import db, Product, DailyProductSales
+from search import all_categories
+from cache import catalog
+
+# restock suggestions for the admin, from the daily sales rollups (which
+# include archived orders). demand is the moving average of units sold per
+# day over the last `window` days, and a product needs reordering when its
+# stock won't last the LEAD_DAYS a delivery takes plus a safety margin for
+# how much its daily sales vary. the suggested quantity brings it up to
+# COVER_DAYS of demand after the delivery arrives. the sums come out of sql
+# grouped per product, everything else is computed for all products at once
+# with numpy, and the report keeps only the products that need reordering
+# (a category page keeps all of them, to show every product's days left). results
+# are cached per category content version, which checkouts and product edits
+# bump, and per day.
+
+WINDOW_DAYS = 28
+MAX_WINDOW_DAYS = 365
+LEAD_DAYS = 7
+COVER_DAYS = 14
+# safety stock in standard deviations of daily demand, 1.65 runs out on about 5% of deliveries
+SAFETY_FACTOR = 1.65
+REPORT_ROWS = 200
+
+# days_left is None for products that haven't sold in the window
+ReorderRow = namedtuple('ReorderRow', 'id name category_id quantity demand days_left reorder_point suggested')
+
+def compute_reorders(stock, sold, sold_squares, window):
+    '''
+    the reorder numbers of many products at once. stock, sold (units sold in
+    the window) and sold_squares (sum of the squares of the daily units sold)
+    are arrays with one entry per product.
+    returns (demand, days_left, reorder_point, suggested) arrays
+    '''
+    import numpy as np
+
+    demand = sold / window
+    variance = np.maximum(sold_squares / window - demand ** 2, 0)
+    safety = SAFETY_FACTOR * np.sqrt(variance * LEAD_DAYS)
+    reorder_point = demand * LEAD_DAYS + safety
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_left = np.where(demand > 0, stock / demand, np.inf)
+    suggested = np.where(stock <= reorder_point, np.ceil(demand * (LEAD_DAYS + COVER_DAYS) + safety - stock), 0)
+    return demand, days_left, reorder_point, np.maximum(suggested, 0)
+
+def load_reorders(category_ids, window, today, all_products=False):
+    '''
+    {category_id: [ReorderRow, ...]} of the products that need reordering in
+    the given categories (all of them for None), or of every product with
+    all_products, with one query for products and one for sales
+    '''
+    # numpy is slow to import and only this report needs it
+    import numpy as np
+
+    where = [Product.category_id.in_(category_ids)] if category_ids is not None else []
+    products = db.session.execute(
+        select(Product.id, Product.name, Product.category_id, Product.quantity).where(*where).order_by(Product.id)
+    ).all()
+    # only the window's days, read from the (day, product_id, quantity) index without touching the table
+    query = select(DailyProductSales.product_id, func.sum(DailyProductSales.quantity),
+                   func.sum(DailyProductSales.quantity * DailyProductSales.quantity)) \
+        .where(DailyProductSales.day > today - datetime.timedelta(days=window)) \
+        .group_by(DailyProductSales.product_id)
+    if where:
+        query = query.where(DailyProductSales.product_id.in_(select(Product.id).where(*where)))
+    sales = db.session.execute(query).all()
+    ids = np.array([product.id for product in products], dtype=np.int64)
+    stock = np.array([product.quantity for product in products], dtype=np.float64)
+    sold = np.zeros(len(products))
+    sold_squares = np.zeros(len(products))
+    if sales:
+        sold_ids, sums, squares = (np.array(column, dtype=np.float64) for column in zip(*sales))
+        # products are sorted by id, so find each sold product's position with a binary search,
+        # skipping the rollups of deleted products
+        sold_ids = sold_ids.astype(np.int64)
+        index = np.minimum(np.searchsorted(ids, sold_ids), max(len(ids) - 1, 0))
+        found = ids[index] == sold_ids if len(ids) else np.zeros(len(sold_ids), dtype=bool)
+        sold[index[found]] = sums[found]
+        sold_squares[index[found]] = squares[found]
+    demand, days_left, reorder_point, suggested = compute_reorders(stock, sold, sold_squares, window)
+    # unless all_products, only products that need reordering become rows
+    needed = np.arange(len(products)) if all_products else np.flatnonzero(suggested > 0)
+    columns = [array[needed].tolist() for array in (demand, days_left, reorder_point, suggested)]
+    reorders = {id: [] for id in category_ids} if category_ids is not None else {}
+    for position, demand, days_left, reorder_point, suggested in zip(needed.tolist(), *columns):
+        product = products[position]
+        reorders.setdefault(product.category_id, []).append(ReorderRow(
+            product.id, product.name, product.category_id, product.quantity, demand,
+            None if days_left == float('inf') else days_left, reorder_point, int(suggested)))
+    return reorders
+
+def category_reorders(category_ids, window=WINDOW_DAYS, today=None, whole_catalog=False, all_products=False):
+    '''
+    {category_id: [ReorderRow, ...]}, computed only for categories whose
+    products or sales changed since they were last cached. whole_catalog says
+    category_ids are all the categories, so a cold cache reads every product
+    without filtering on category. all_products includes the products that
+    don't need reordering
+    '''
+    # rollups are per utc day
+    today = today or datetime.datetime.utcnow().date()
+    prefix = 'reorder-all' if all_products else 'reorder'
+    keys = {'%s:%d:%d:%s:%d' % (prefix, id, catalog.category_version(id), today, window): id for id in category_ids}
+    def load(missing):
+        ids = [keys[key] for key in missing]
+        reorders = load_reorders(None if whole_catalog and len(ids) == len(keys) else ids, window, today, all_products)
+        return {key: reorders.get(keys[key], []) for key in missing}
+    cached = catalog.get_many_or_set(list(keys), load)
+    return {keys[key]: rows for key, rows in cached.items()}
+
+def reorder_report(window=WINDOW_DAYS, today=None):
+    '''the products most in need of a reorder, soonest to run out first. returns (rows, total)'''
+    categories = catalog.get_or_set('categories', all_categories)
+    reorders = category_reorders([category.id for category in categories], window, today, whole_catalog=True)
+    rows = [row for rows in reorders.values() for row in rows]
+    rows.sort(key=lambda row: (row.days_left if row.days_left is not None else float('inf'), row.id))
+    return rows[:REPORT_ROWS], len(rows)
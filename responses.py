@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import os
+from functools import wraps
+from flask import current_app, g, request, session, url_for, make_response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from cache import catalog
+
+# html, json, css and js responses of at least COMPRESS_MIN_SIZE bytes are
+# gzip (or, when the brotli package is installed and the client accepts it,
+# brotli) compressed. pages marked @conditional get a weak etag made from
+# versions we already keep instead of a hash of the body, so a browser
+# revalidating an unchanged page gets a 304 without the view running at all.
+# that takes CATALOG_CACHE_BACKEND=sqlite, the local backend's versions are
+# per process and can't vouch for other workers' writes.
+# css and js live in static/ and are linked with asset_url(), which adds a
+# fingerprint of the file so they can be cached for a year.
+
+COMPRESSIBLE = {'text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript', 'text/javascript'}
+BROTLI_QUALITY = 5
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+## compression
+
+def compress(response):
+    if not current_app.config['COMPRESS'] or response.mimetype not in COMPRESSIBLE:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    if response.direct_passthrough:
+        # files from send_file, only static assets are worth reading into memory
+        if request.endpoint != 'static':
+            return response
+    elif response.is_streamed:
+        # the streamed order history pages are sent as they are generated
+        return response
+    minimum = current_app.config['COMPRESS_MIN_SIZE']
+    if response.content_length is not None and response.content_length < minimum:
+        return response
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+    if not encoding:
+        return response
+    response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < minimum:
+        return response
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, current_app.config['COMPRESS_LEVEL'], mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    # the compressed body is a different representation, so a strong etag no longer fits
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+## conditional pages
+
+def release():
+    '''digest of the templates and static files, so pages change when the app is deployed'''
+    if 'release' not in current_app.extensions or current_app.debug:
+        digest = hashlib.sha256()
+        for folder in [os.path.join(current_app.root_path, current_app.template_folder), current_app.static_folder]:
+            for root, dirs, files in sorted(os.walk(folder)):
+                for name in sorted(files):
+                    with open(os.path.join(root, name), 'rb') as file:
+                        digest.update(name.encode() + file.read())
+        current_app.extensions['release'] = digest.hexdigest()[:12]
+    return current_app.extensions['release']
+
+def page_etag():
+    # everything a logged in page can depend on, none of it needs the database
+    return '%s-%s-%d-%d-%d' % (release(), catalog.scope(), catalog.version(), g.user.id, catalog.user_version(g.user.id))
+
+def conditional(func):
+    '''
+    answer If-None-Match on a logged in page with a 304 when the catalog, the
+    user's own data and the app haven't changed. goes under @auth_required.
+    needs a shared catalog cache backend, with the local one every worker only
+    sees its own writes
+    '''
+    @wraps(func)
+    def inner(*args, **kwargs):
+        # flashed messages are shown once, a cached copy must not show them again
+        if session.get('_flashes') or not catalog.shared:
+            return func(*args, **kwargs)
+        etag = page_etag()
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(func(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return inner
+
+## static assets
+
+def asset_digest(filename):
+    digests = current_app.extensions['asset_digests']
+    if filename not in digests or current_app.debug:
+        with open(os.path.join(current_app.static_folder, filename), 'rb') as file:
+            digests[filename] = hashlib.sha256(file.read()).hexdigest()[:12]
+    return digests[filename]
+
+def asset_url(filename):
+    '''url of a static file with its fingerprint, the url changes whenever the file does'''
+    return url_for('static', filename=filename, v=asset_digest(filename))
+
+def cache_assets(response):
+    # a fingerprinted url always serves the same bytes, so it can be cached for good
+    if request.endpoint == 'static' and response.status_code in (200, 304) \
+            and request.args.get('v') == asset_digest(request.view_args['filename']):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = ASSET_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+def init_app(app):
+    app.extensions['asset_digests'] = {}
+    app.jinja_env.globals['asset_url'] = asset_url
+    # after_request functions run last registered first, so compression comes after the cache headers
+    app.after_request(compress)
+    app.after_request(cache_assets)
@@ -0,0 +1,138 @@
+import datetime
+import json
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, delete, func
+
+from database import upsert
+from models import db, Product, Category, Order, Transaction, ArchivedTransaction, DailyProductSales, DailyCategorySales
+
+BACKFILL_BATCH = 5000
+DASHBOARD_DAYS = 14
+MAX_DASHBOARD_DAYS = 366
+TOP_PRODUCT_DAYS = 7
+TOP_PRODUCTS = 10
+
+## keeping the rollups up to date
+
+def add_to_rollup(model, keys, rows):
+    # add to the existing row for the same day and product/category, or create it
+    statement = upsert(db.session, model)
+    statement = statement.on_conflict_do_update(index_elements=keys, set_={
+        column: getattr(model, column) + getattr(statement.excluded, column)
+        for column in ('quantity', 'revenue', 'orders')
+    })
+    db.session.execute(statement, rows)
+
+def record_sales(sales):
+    '''
+    add order lines to the rollups, without committing. sales is an iterable of
+    (day, product_id, category_id, quantity, price) tuples, one per order line.
+    lines of deleted products (category_id None) only count for the product.
+    '''
+    products, categories = {}, {}
+    for day, product_id, category_id, quantity, price in sales:
+        for totals, key in ((products, (day, product_id)), (categories, (day, category_id))):
+            if key[1] is None:
+                continue
+            total = totals.setdefault(key, [0, 0.0, 0])
+            total[0] += quantity
+            total[1] += quantity * price
+            total[2] += 1
+    for model, column, totals in ((DailyProductSales, 'product_id', products), (DailyCategorySales, 'category_id', categories)):
+        if totals:
+            add_to_rollup(model, ['day', column], [
+                {'day': day, column: id, 'quantity': quantity, 'revenue': revenue, 'orders': orders}
+                for (day, id), (quantity, revenue, orders) in totals.items()
+            ])
+
+def backfill(batch=BACKFILL_BATCH, progress=None):
+    '''
+    rebuild the rollups from the order history, archived and live, committing every
+    `batch` transactions. checkouts that happen while it runs record their own
+    sales as usual. progress(source, done, last) is called after every batch,
+    source is 'archive' or 'live'. returns the id of the last live transaction included
+    '''
+    db.session.execute(delete(DailyProductSales))
+    db.session.execute(delete(DailyCategorySales))
+    last_archived = db.session.scalar(select(func.max(ArchivedTransaction.id))) or 0
+    last = db.session.scalar(select(func.max(Transaction.id))) or 0
+    db.session.commit()
+    for start in range(0, last_archived, batch):
+        archived = db.session.execute(
+            select(ArchivedTransaction.datetime, ArchivedTransaction.lines)
+            .where(ArchivedTransaction.id > start, ArchivedTransaction.id <= min(start + batch, last_archived))
+        ).all()
+        sales = [(row.datetime.date(), product_id, quantity, price)
+                 for row in archived for product_id, quantity, price in json.loads(row.lines)]
+        # the archive is in another database, so look the categories up separately
+        product_ids = {product_id for day, product_id, quantity, price in sales}
+        categories = dict(db.session.execute(
+            select(Product.id, Product.category_id).where(Product.id.in_(product_ids))
+            .execution_options(include_deleted=True)
+        ).all()) if product_ids else {}
+        record_sales((day, product_id, categories.get(product_id), quantity, price) for day, product_id, quantity, price in sales)
+        db.session.commit()
+        if progress:
+            progress('archive', min(start + batch, last_archived), last_archived)
+    for start in range(0, last, batch):
+        rows = db.session.execute(
+            select(Transaction.datetime, Order.product_id, Product.category_id, Order.quantity, Order.price)
+            .join(Order, Order.transaction_id == Transaction.id)
+            .outerjoin(Product, Product.id == Order.product_id)
+            .where(Transaction.id > start, Transaction.id <= min(start + batch, last))
+            .execution_options(include_deleted=True)
+        )
+        record_sales((row.datetime.date(), row.product_id, row.category_id, row.quantity, row.price) for row in rows)
+        db.session.commit()
+        if progress:
+            progress('live', min(start + batch, last), last)
+    return last
+
+@click.command('backfill-sales')
+@click.option('--batch', default=BACKFILL_BATCH, help='Transactions per batch.')
+@with_appcontext
+def backfill_command(batch):
+    '''Rebuild the daily sales rollups from the order history.'''
+    backfill(batch, lambda source, done, last: click.echo('%s: %d / %d transactions' % (source, done, last)))
+    click.echo('sales rollups rebuilt')
+
+## reports
+
+def sales_dashboard(days=DASHBOARD_DAYS, today=None):
+    '''
+    revenue per category per day for the last `days` days and the best selling
+    products of the last week, read only from the rollups
+    '''
+    # transactions are stamped in utc
+    today = today or datetime.datetime.utcnow().date()
+    start = today - datetime.timedelta(days=days - 1)
+    rows = db.session.execute(
+        select(DailyCategorySales.day, DailyCategorySales.category_id, Category.name, DailyCategorySales.revenue)
+        .outerjoin(Category, Category.id == DailyCategorySales.category_id)
+        .where(DailyCategorySales.day >= start)
+        .execution_options(include_deleted=True)
+    ).all()
+    top_products = db.session.execute(
+        select(DailyProductSales.product_id, Product.name,
+               func.sum(DailyProductSales.quantity).label('quantity'),
+               func.sum(DailyProductSales.revenue).label('revenue'))
+        .outerjoin(Product, Product.id == DailyProductSales.product_id)
+        .where(DailyProductSales.day >= today - datetime.timedelta(days=TOP_PRODUCT_DAYS - 1))
+        .group_by(DailyProductSales.product_id, Product.name)
+        .order_by(func.sum(DailyProductSales.revenue).desc())
+        .limit(TOP_PRODUCTS)
+        .execution_options(include_deleted=True)
+    ).all()
+    categories = {}
+    revenue = {}
+    for row in rows:
+        categories[row.category_id] = row.name
+        revenue[row.day, row.category_id] = row.revenue
+    days = [today - datetime.timedelta(days=n) for n in range(days)]
+    return {
+        'days': [(day, sum(revenue.get((day, id), 0) for id in categories)) for day in days],
+        'categories': sorted(categories.items(), key=lambda category: category[1] or ''),
+        'revenue': revenue,
+        'top_products': top_products,
+    }
@@ -0,0 +1,145 @@
+from collections import namedtuple
+from itertools import groupby
+from sqlalchemy import text, tuple_, select, union_all
+from sqlalchemy.orm import contains_eager
+
+from models import db, Product, Category, search_index_available
+
+PRODUCTS_PER_PAGE = 48
+CATEGORIES_PER_PAGE = 10
+# browsing shows the first few products of each category, with a link to the rest
+PRODUCTS_PER_CATEGORY = 12
+
+# the trigram tokenizer cannot match anything shorter than 3 characters
+MIN_INDEXED_QUERY = 3
+
+# plain snapshots of catalog rows, safe to cache and share between requests
+CategoryRow = namedtuple('CategoryRow', ['id', 'name'])
+ProductRow = namedtuple('ProductRow', ['id', 'name', 'category_id', 'quantity', 'price', 'man_date'])
+
+## helpers
+
+def category_row(category):
+    return CategoryRow(category.id, category.name)
+
+def product_row(product):
+    return ProductRow(product.id, product.name, product.category_id, product.quantity, product.price, product.man_date)
+
+def parse_cursor(after):
+    # cursors look like '<category_id>-<product_id>' for searches and '<category_id>' for browsing
+    if not after:
+        return None
+    parts = after.split('-')
+    if not all(part.isdigit() for part in parts):
+        return None
+    return tuple(int(part) for part in parts)
+
+def parse_price_cursor(after):
+    # price searches are paged on (price, id), with cursors like '<price>_<product_id>'
+    if not after or '_' not in after:
+        return None
+    price, _, id = after.rpartition('_')
+    if not id.isdigit():
+        return None
+    try:
+        return float(price), int(id)
+    except ValueError:
+        return None
+
+def name_filter(column, index_column, query):
+    # match against the fts index if we have one, else fall back to a LIKE scan
+    if len(query) >= MIN_INDEXED_QUERY and search_index_available():
+        phrase = '"' + query.replace('"', '""') + '"'
+        matches = text('SELECT rowid FROM product_search WHERE product_search MATCH :match') \
+            .bindparams(match=index_column + ' : ' + phrase) \
+            .columns(rowid=db.Integer)
+        return Product.id.in_(matches.scalar_subquery())
+    return column.ilike('%' + query + '%')
+
+## queries
+
+def all_categories():
+    return [CategoryRow(*row) for row in db.session.query(Category.id, Category.name).order_by(Category.id)]
+
+def browse_categories(after=None, per_page=CATEGORIES_PER_PAGE):
+    '''
+    one page of categories for the unfiltered storefront, their products are
+    loaded separately with category_products so they can be cached per category.
+    returns ([category, ...], next_cursor)
+    '''
+    query = db.session.query(Category.id, Category.name).order_by(Category.id)
+    cursor = parse_cursor(after)
+    if cursor:
+        query = query.filter(Category.id > cursor[0])
+    categories = [CategoryRow(*row) for row in query.limit(per_page + 1)]
+    next_cursor = None
+    if len(categories) > per_page:
+        categories = categories[:per_page]
+        next_cursor = str(categories[-1].id)
+    return categories, next_cursor
+
+def category_products(category_ids, limit=PRODUCTS_PER_CATEGORY):
+    '''
+    the first `limit` products of each of the given categories and one more
+    if there are others, as a dict of category id -> [product, ...]
+    '''
+    products = {category_id: [] for category_id in category_ids}
+    if not category_ids:
+        return products
+    columns = [Product.id, Product.name, Product.category_id, Product.quantity, Product.price, Product.man_date]
+    # one limited select per category, each reads only its first rows off the category index
+    query = union_all(*[
+        select(*columns).where(Product.category_id == category_id).order_by(Product.id).limit(limit + 1).subquery().select()
+        for category_id in category_ids
+    ])
+    for row in db.session.execute(query):
+        products[row.category_id].append(ProductRow(*row))
+    for rows in products.values():
+        rows.sort(key=lambda product: product.id)
+    return products
+
+def search_products(parameter, value, after=None, per_page=PRODUCTS_PER_PAGE):
+    '''
+    one page of products matching the search, grouped by category.
+    parameter is one of 'product', 'category', 'price' (value is then the max price)
+    or 'category_id' (every product of one category).
+    returns ([(category, products), ...], next_cursor)
+    '''
+    query = Product.query.join(Product.category).options(contains_eager(Product.category))
+    if parameter == 'category_id':
+        query = query.filter(Product.category_id == value)
+    elif parameter == 'product':
+        query = query.filter(name_filter(Product.name, 'name', value))
+    elif parameter == 'category':
+        query = query.filter(name_filter(Category.name, 'category', value))
+    elif parameter == 'price':
+        return price_search(query.filter(Product.price <= value), after, per_page)
+    cursor = parse_cursor(after)
+    if cursor and len(cursor) == 2:
+        query = query.filter(tuple_(Product.category_id, Product.id) > cursor)
+    products = query.order_by(Product.category_id, Product.id).limit(per_page + 1).all()
+    next_cursor = None
+    if len(products) > per_page:
+        products = products[:per_page]
+        next_cursor = '%d-%d' % (products[-1].category_id, products[-1].id)
+    groups = [(category_row(category), [product_row(p) for p in items]) for category, items in groupby(products, key=lambda p: p.category)]
+    return groups, next_cursor
+
+def price_search(query, after, per_page):
+    '''
+    a max price search, read cheapest first straight off the price index and
+    grouped by category afterwards. returns ([(category, products), ...], next_cursor)
+    '''
+    cursor = parse_price_cursor(after)
+    if cursor:
+        query = query.filter(tuple_(Product.price, Product.id) > cursor)
+    products = query.order_by(Product.price, Product.id).limit(per_page + 1).all()
+    next_cursor = None
+    if len(products) > per_page:
+        products = products[:per_page]
+        next_cursor = '%r_%d' % (products[-1].price, products[-1].id)
+    categories = {}
+    for product in products:
+        categories.setdefault(product.category_id, (product.category, []))[1].append(product_row(product))
+    groups = [(category_row(category), items) for category_id, (category, items) in sorted(categories.items())]
+    return groups, next_cursor
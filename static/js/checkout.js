@@ -0,0 +1,15 @@
+var statusUrl = document.currentScript.dataset.statusUrl;
+
+// poll until a worker has settled the order, then let the page redirect
+(function poll() {
+    fetch(statusUrl)
+        .then(response => response.json())
+        .then(job => {
+            if (job.status === 'done' || job.status === 'failed') {
+                window.location.reload();
+            } else {
+                setTimeout(poll, 500);
+            }
+        })
+        .catch(() => setTimeout(poll, 2000));
+})();
@@ -0,0 +1,55 @@
+function increaseqty(id, max){
+    var quantity = document.querySelector(".quantity-input-"+id);
+    if(quantity.value < max){
+        quantity.value = parseInt(quantity.value) + 1;
+    }
+}
+function decreaseqty(id){
+    var quantity = document.querySelector(".quantity-input-"+id);
+    if(quantity.value > 1){
+        quantity.value = parseInt(quantity.value) - 1;
+    }
+}
+
+// add to cart without reloading the page. clicks made within a short
+// time of each other are sent together in one request
+var updateUrl = document.currentScript.dataset.updateUrl;
+var pending = [];
+var timer = null;
+function showMessage(message, success){
+    var alert = document.createElement("div");
+    alert.className = "alert alert-dismissible fade show " + (success ? "alert-success" : "alert-danger");
+    alert.setAttribute("role", "alert");
+    alert.textContent = message;
+    var close = document.createElement("button");
+    close.type = "button";
+    close.className = "btn-close";
+    close.setAttribute("data-bs-dismiss", "alert");
+    alert.appendChild(close);
+    document.getElementById("cart-messages").replaceChildren(alert);
+}
+function sendPending(){
+    var lines = pending;
+    pending = [];
+    timer = null;
+    fetch(updateUrl, {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify({lines: lines, add: true})
+    }).then(function(response){
+        return response.json().then(function(body){
+            var errors = (body.errors || []).map(function(error){ return error.message; });
+            showMessage([body.message].concat(errors).join(" "), response.ok);
+        });
+    }).catch(function(){
+        showMessage("Could not reach the server, please try again.", false);
+    });
+}
+document.querySelectorAll("form[data-product-id]").forEach(function(form){
+    form.addEventListener("submit", function(event){
+        event.preventDefault();
+        pending.push({product_id: parseInt(form.dataset.productId), quantity: parseInt(form.quantity.value)});
+        clearTimeout(timer);
+        timer = setTimeout(sendPending, 400);
+    });
+});
@@ -0,0 +1,19 @@
+// fetch the next page and append its transactions instead of navigating to it
+function loadMore(link){
+    fetch(link.href).then(function(response){
+        return response.text();
+    }).then(function(html){
+        var page = new DOMParser().parseFromString(html, 'text/html');
+        var details = document.querySelector('.order-details');
+        page.querySelector('.order-details').childNodes.forEach(function(node){
+            details.appendChild(node.cloneNode(true));
+        });
+        var next = page.querySelector('#load-more');
+        if(next){
+            link.href = next.href;
+        } else {
+            link.parentNode.remove();
+        }
+    });
+    return false;
+}
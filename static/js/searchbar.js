@@ -0,0 +1,3 @@
+function clearSearch(){
+    window.location.href = window.location.href.split('?')[0];
+}
@@ -0,0 +1,186 @@
+import json
+import re
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, g, jsonify, Response, stream_template, stream_with_context
+from markupsafe import Markup
+from sqlalchemy.orm import joinedload
+
+from models import db, Cart, CheckoutJob
+from search import browse_categories, category_products, search_products, PRODUCTS_PER_CATEGORY
+from cache import catalog
+from querycount import query_budget
+from database import read_only
+from checkout import checkout
+from checkout_queue import enqueue_checkout, start_workers, job_status
+from carts import parse_lines, update_cart
+from history import transactions_page, iter_transactions, iter_transaction_dicts
+from auth import auth_required
+from responses import conditional
+
+bp = Blueprint('store', __name__)
+
+def product_list_fragments(categories):
+    # the product grid of a category is the same for every user until its products
+    # or their stock change, so cache the rendered html per category content version
+    keys = {category.id: 'fragment:products:%d:%d' % (category.id, catalog.category_version(category.id))
+            for category in categories}
+    def render(missing):
+        ids = [category_id for category_id, key in keys.items() if key in missing]
+        products = category_products(ids)
+        return {keys[category_id]: render_template('product/list.html', products=products[category_id][:PRODUCTS_PER_CATEGORY],
+                                                   more=len(products[category_id]) > PRODUCTS_PER_CATEGORY, category_id=category_id)
+                for category_id in ids}
+    fragments = catalog.get_many_or_set(list(keys.values()), render)
+    return [Markup(fragments[keys[category.id]]) for category in categories]
+
+@bp.route('/')
+@auth_required
+@conditional
+@read_only
+@query_budget(3)
+def index():
+    user = g.user
+    if user.is_admin:
+        return redirect(url_for('admin.dashboard'))
+    parameter = request.args.get('parameter')
+    query = request.args.get('query')
+    after = request.args.get('after')
+    parameters = {
+        'category': 'Category Name',
+        'product': 'Product Name',
+        'price': 'Max Price'
+    }
+    category = request.args.get('category', '')
+    if category.isdigit():
+        # every product of one category, linked from under its first few when browsing
+        groups, next_cursor = catalog.get_or_set('search:category_id:%s:%s' % (category, after),
+                                                 lambda: search_products('category_id', int(category), after))
+        return render_template('index.html', user=user, groups=groups, next_cursor=next_cursor, category=category, parameters=parameters)
+    if not parameter or not query or parameter not in parameters:
+        categories, next_cursor = catalog.get_or_set('browse:%s' % after, lambda: browse_categories(after))
+        groups = list(zip(categories, product_list_fragments(categories)))
+        return render_template('index.html', user=user, groups=groups, next_cursor=next_cursor, parameters=parameters)
+    value = query
+    if parameter == 'price':
+        if not re.match(r'^\d+(\.\d+)?$', query):
+            flash('Price must be a number.')
+            return redirect(url_for('store.index'))
+        value = float(query)
+    groups, next_cursor = catalog.get_or_set('search:%s:%s:%s' % (parameter, value, after),
+                                             lambda: search_products(parameter, value, after))
+    return render_template('index.html', user=user, groups=groups, next_cursor=next_cursor, query=query, parameter=parameter, parameters=parameters)
+
+@bp.route('/cart/<int:product_id>/add', methods=['POST'])
+@auth_required
+def add_to_cart(product_id):
+    quantity = request.form.get('quantity')
+    if not quantity or quantity == '':
+        flash('Quantity cannot be empty.')
+        return redirect(url_for('store.index'))
+    if quantity.isdigit() == False:
+        flash('Quantity must be a number.')
+        return redirect(url_for('store.index'))
+    quantity = int(quantity)
+    if quantity <= 0:
+        flash('Quantity must be greater than 0.')
+        return redirect(url_for('store.index'))
+    errors = update_cart(session['user_id'], {product_id: quantity}, add=True)
+    if errors:
+        flash(errors[0]['message'])
+        return redirect(url_for('store.index'))
+    flash('Product added to cart successfully.')
+    return redirect(url_for('store.index'))
+
+@bp.route('/cart/update', methods=['POST'])
+@auth_required
+@query_budget(4)
+def update_cart_lines():
+    '''
+    change many cart lines in one request, the storefront batches add to cart clicks into this.
+    body: {"lines": [{"product_id": 1, "quantity": 2}, ...], "add": true}, without add the quantities are set
+    '''
+    body = request.get_json(silent=True) or {}
+    add = body.get('add') is True
+    quantities, error = parse_lines(body.get('lines'), add)
+    if error:
+        return jsonify(message=error), 400
+    errors = update_cart(g.user.id, quantities, add)
+    if errors:
+        return jsonify(message='Cart was not changed.', errors=errors), 400
+    return jsonify(message=('Added %d products to cart successfully.' if add else 'Updated %d cart lines successfully.') % len(quantities))
+
+@bp.route('/cart')
+@auth_required
+@conditional
+@read_only
+@query_budget(2)
+def cart():
+    carts = Cart.query.filter_by(user_id=session['user_id']).options(joinedload(Cart.product)).all()
+    total = sum([cart.product.price * cart.quantity for cart in carts])
+    return render_template('cart.html', user=g.user, carts=carts, total=total)
+
+@bp.route('/cart/<int:product_id>/delete', methods=['POST'])
+@auth_required
+def delete_from_cart(product_id):
+    cart = Cart.query.filter_by(user_id=session['user_id']).filter_by(product_id=product_id).first()
+    if not cart:
+        flash('Product does not exist in cart.')
+        return redirect(url_for('store.cart'))
+    db.session.delete(cart)
+    db.session.commit()
+    catalog.bump_user(session['user_id'])
+    flash('Product deleted from cart successfully.')
+    return redirect(url_for('store.cart'))
+
+@bp.route('/cart/place_order', methods=['POST'])
+@auth_required
+def place_order():
+    if current_app.config['CHECKOUT_QUEUE']:
+        job, error = enqueue_checkout(session['user_id'])
+        if error:
+            flash(error)
+            return redirect(url_for('store.cart'))
+        return redirect(url_for('store.checkout_status', id=job.id))
+    transaction, error = checkout(session['user_id'])
+    if error:
+        flash(error)
+        return redirect(url_for('store.cart'))
+    flash('Order placed successfully.')
+    return redirect(url_for('store.orders'))
+
+@bp.route('/checkout/<int:id>')
+@auth_required
+@query_budget(2)
+def checkout_status(id):
+    '''where a queued order waits for the checkout workers, ?format=json is polled by the page'''
+    job = CheckoutJob.query.filter_by(id=id, user_id=g.user.id).first()
+    if not job:
+        flash('Order does not exist.')
+        return redirect(url_for('store.orders'))
+    if request.args.get('format') == 'json':
+        return jsonify(job_status(job))
+    if job.status == 'done':
+        flash('Order placed successfully.')
+        return redirect(url_for('store.orders'))
+    if job.status == 'failed':
+        flash(job.error)
+        return redirect(url_for('store.cart'))
+    # jobs left over from before a restart need a worker too
+    start_workers(current_app._get_current_object())
+    return render_template('checkout.html', user=g.user, job=job)
+
+@bp.route('/orders')
+@auth_required
+@conditional
+@read_only
+# 3 for a page of live history, 2 more for the page where it runs into the archive
+@query_budget(5)
+def orders():
+    user = g.user
+    # the streamed variants send the whole history without holding it in memory
+    if request.args.get('format') == 'ndjson':
+        lines = (json.dumps(transaction) + '\n' for transaction in iter_transaction_dicts(user.id))
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    if request.args.get('stream'):
+        return Response(stream_template('orders.html', user=user, transactions=iter_transactions(user.id)))
+    transactions, next_cursor = transactions_page(user.id, request.args.get('after'))
+    return render_template('orders.html', user=user, transactions=transactions, next_cursor=next_cursor)
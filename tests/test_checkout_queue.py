@@ -0,0 +1,80 @@
+'''
+queued checkouts settled by process_batch.
+
+usage: python -m pytest tests
+'''
+import datetime
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app
+from migrations import init_db
+from models import db, User, Category, Product, Cart, CheckoutJob, Transaction, Order
+from checkout_queue import process_batch
+
+def enforce_foreign_keys(dbapi_connection, connection_record):
+    # like postgres, so a dangling reference fails instead of being stored
+    dbapi_connection.execute('PRAGMA foreign_keys = ON')
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % (tmp_path / 'store.db'),
+        'SQLALCHEMY_BINDS': {},
+        'SQLALCHEMY_ARCHIVE_URI': None,
+        'SECRET_KEY': 'test',
+        'TESTING': True,
+        'CHECKOUT_QUEUE': True,
+        # jobs are settled by calling process_batch
+        'CHECKOUT_WORKERS': 0,
+    })
+    with app.app_context():
+        event.listen(db.engine, 'connect', enforce_foreign_keys)
+        init_db()
+        db.session.add(Category(name='Fruits'))
+        db.session.add(User(username='buyer', password='buyer'))
+        db.session.flush()
+        today = datetime.date.today()
+        db.session.add_all([Product(name=name, category_id=1, quantity=10, price=1, man_date=today)
+                            for name in ('Apple', 'Banana', 'Cherry')])
+        db.session.commit()
+    return app
+
+def login(app, username, password):
+    client = app.test_client()
+    assert client.post('/login', data={'username': username, 'password': password}).status_code == 302
+    return client
+
+@pytest.mark.parametrize('sold', [False, True], ids=['deleted', 'flagged'])
+def test_product_deleted_while_queued(app, sold):
+    with app.app_context():
+        if sold:
+            # a past order keeps the product around as is_deleted
+            buyer = User.query.filter_by(username='buyer').first()
+            transaction = Transaction(user_id=buyer.id, total=1)
+            db.session.add(transaction)
+            db.session.flush()
+            db.session.add(Order(transaction_id=transaction.id, product_id=1, quantity=1, price=1))
+            db.session.commit()
+    buyer = login(app, 'buyer', 'buyer')
+    buyer.post('/cart/1/add', data={'quantity': '1'})
+    buyer.post('/cart/2/add', data={'quantity': '2'})
+    assert buyer.post('/cart/place_order').status_code == 302
+    admin = login(app, 'admin', 'admin')
+    assert admin.post('/product/1/delete').status_code == 302
+
+    with app.app_context():
+        assert process_batch(10) == 1
+        job = CheckoutJob.query.one()
+        assert job.status == 'failed'
+        # the cart comes back without the deleted product
+        assert [(line.product_id, line.quantity) for line in Cart.query.order_by(Cart.product_id)] == [(2, 2)]
+        deleted = db.session.get(Product, 1, execution_options={'include_deleted': True})
+        assert (deleted is not None and deleted.is_deleted) if sold else deleted is None
+    assert buyer.get('/cart').status_code == 200
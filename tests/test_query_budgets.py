@@ -0,0 +1,89 @@
+'''
+every route with a @query_budget stays within it, with a cold and a warm catalog cache.
+
+usage: python -m pytest tests
+
+the app runs with QUERY_BUDGET_ENFORCE, so a route going over its budget
+raises QueryBudgetExceeded instead of only being counted.
+'''
+import datetime
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from app import create_app
+from cache import CatalogCache, make_backend
+from migrations import init_db
+from models import db, User, CheckoutJob
+from seed import seed, PASSWORD
+
+# (role, method, path, json body). {user} is the customer's id, {job} their checkout job's
+ROUTES = [
+    ('customer', 'GET', '/', None),
+    ('customer', 'GET', '/?parameter=product&query=apple', None),
+    ('customer', 'GET', '/?parameter=category&query=milk', None),
+    ('customer', 'GET', '/?parameter=price&query=50', None),
+    ('customer', 'GET', '/?category=1', None),
+    ('customer', 'POST', '/cart/update', {'lines': [{'product_id': 1, 'quantity': 1}, {'product_id': 2, 'quantity': 1}], 'add': True}),
+    ('customer', 'GET', '/cart', None),
+    ('customer', 'GET', '/checkout/{job}?format=json', None),
+    ('customer', 'GET', '/orders', None),
+    ('admin', 'GET', '/admin', None),
+    ('admin', 'GET', '/admin/sales', None),
+    ('admin', 'GET', '/admin/reorder', None),
+    ('admin', 'GET', '/category/1/show', None),
+    ('admin', 'GET', '/product/1/delete', None),
+    ('admin', 'GET', '/category/1/delete', None),
+]
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    path = tmp_path_factory.mktemp('budgets') / 'store.db'
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % path,
+        'SQLALCHEMY_BINDS': {},
+        'SQLALCHEMY_ARCHIVE_URI': None,
+        'SECRET_KEY': 'test',
+        'TESTING': True,
+        'QUERY_BUDGET_ENFORCE': True,
+    })
+    with app.app_context():
+        init_db()
+        seed(users=5, categories=4, products=60, orders_per_user=3)
+        customer = User.query.filter_by(username='user0').first()
+        job = CheckoutJob(user_id=customer.id, status='done', lines=json.dumps([]),
+                          finished_at=datetime.datetime.utcnow())
+        db.session.add(job)
+        db.session.commit()
+        app.config['TEST_IDS'] = {'user': customer.id, 'job': job.id}
+    return app
+
+def login(app, role):
+    client = app.test_client()
+    username = 'admin' if role == 'admin' else 'user0'
+    password = 'admin' if role == 'admin' else PASSWORD
+    assert client.post('/login', data={'username': username, 'password': password}).status_code == 302
+    return client
+
+def test_every_budgeted_route_is_covered(app):
+    budgeted = {endpoint for endpoint, view in app.view_functions.items() if hasattr(view, 'query_budget')}
+    adapter = app.url_map.bind('localhost')
+    covered = {adapter.match(path.split('?')[0].format(**app.config['TEST_IDS']), method=method)[0]
+               for role, method, path, body in ROUTES}
+    assert budgeted <= covered, 'add these routes to ROUTES: %s' % sorted(budgeted - covered)
+
+@pytest.mark.parametrize('role, method, path, body', ROUTES)
+def test_route_within_budget(app, role, method, path, body):
+    # a new catalog cache, so the first request fills it and the second reads it
+    app.extensions['catalog_cache'] = CatalogCache(make_backend(app.config))
+    client = login(app, role)
+    path = path.format(**app.config['TEST_IDS'])
+    for cache in ('cold', 'warm'):
+        response = client.open(path, method=method, json=body)
+        assert response.status_code < 400, '%s %s (%s cache) returned %d' % (method, path, cache, response.status_code)